@@ -0,0 +1,180 @@
+"""Доска на битовых масках
+Позиция хранится в двенадцати 64-битных числах (по одному на цвет и тип фигуры) и масках занятых клеток.
+Клетке (row, col) соответствует бит row * 8 + col.
+Ходы и атаки фигур считаются сдвигами и масками, а правила игры (шах, рокировка, конец игры) остаются в классе Board.
+Сами фигуры по-прежнему хранятся в field, так как у них есть состояние: рокировка, взятие на проходе, шах
+"""
+from Board import Board
+from Pieces import Piece, Pawn, KNIGHT_TARGETS, KING_TARGETS, PAWN_CAPTURE_TARGETS, RAYS
+from colors import WHITE, BLACK, opponent, correct_cords
+
+CHARS = ('P', 'N', 'B', 'R', 'Q', 'K')
+
+# Направления лучей в виде (изменение строки, изменение столбца).
+# По первым четырем номер клетки растет, поэтому ближайшая фигура на луче - младший бит, по остальным - старший
+POSITIVE_RAYS = ((1, 0), (0, 1), (1, 1), (1, -1))
+NEGATIVE_RAYS = ((-1, 0), (0, -1), (-1, -1), (-1, 1))
+
+
+def square_mask(row, col) -> int:
+    """Маска одной клетки"""
+    return 1 << (row * 8 + col)
+
+
+def cell_masks(cells_table) -> list[int]:
+    """Для каждой клетки маска клеток из таблицы Pieces (KNIGHT_TARGETS, RAYS[direction] и т.п.)
+    Маски строятся из тех же таблиц, что и ходы обычной доски, чтобы геометрия ходов была одна"""
+    return [sum(square_mask(row, col) for row, col in cells) for cells in cells_table]
+
+
+KNIGHT_MASKS = cell_masks(KNIGHT_TARGETS)
+KING_MASKS = cell_masks(KING_TARGETS)
+# Клетки, которые атакует пешка цвета color с данной клетки
+PAWN_ATTACK_MASKS = {color: cell_masks(PAWN_CAPTURE_TARGETS[color]) for color in (WHITE, BLACK)}
+RAY_MASKS = {direction: cell_masks(RAYS[direction]) for direction in POSITIVE_RAYS + NEGATIVE_RAYS}
+ROOK_RAYS = ((1, 0), (0, 1)), ((-1, 0), (0, -1))
+BISHOP_RAYS = ((1, 1), (1, -1)), ((-1, -1), (-1, 1))
+
+
+def slide_mask(square, occupied, rays) -> int:
+    """Клетки, которые дальнобойная фигура с клетки square атакует по лучам rays
+    rays - пара (лучи в сторону роста номера клетки, лучи в сторону уменьшения)"""
+    positive, negative = rays
+    attacks = 0
+    for direction in positive:
+        ray = RAY_MASKS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAY_MASKS[direction][(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for direction in negative:
+        ray = RAY_MASKS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= RAY_MASKS[direction][blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def mask_to_cells(mask) -> list[tuple[int, int]]:
+    """Перевести маску в список клеток (row, col)"""
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(divmod(low.bit_length() - 1, 8))
+        mask ^= low
+    return cells
+
+
+class BitBoard(Board):
+    """Доска, которая дополнительно хранит позицию в битовых масках и считает по ним ходы и атаки"""
+    def __init__(self):
+        super().__init__()
+        self.load_bitboards()
+
+    def load_bitboards(self) -> None:
+        """Заполнить битовые маски по текущему положению фигур в field"""
+        self.bitboards: dict[tuple[int, str], int] = {(color, char): 0 for color in (WHITE, BLACK) for char in CHARS}
+        self.occupied: dict[int, int] = {WHITE: 0, BLACK: 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.field[row][col]
+                if piece is not None:
+                    self.bitboards[(piece.color, piece.char())] |= square_mask(row, col)
+                    self.occupied[piece.color] |= square_mask(row, col)
+
+    def set_piece(self, row, col, piece: Piece | None) -> None:
+        mask = square_mask(row, col)
+        old = self.field[row][col]
+        if old is not None:
+            self.bitboards[(old.color, old.char())] &= ~mask
+            self.occupied[old.color] &= ~mask
+        if piece is not None:
+            self.bitboards[(piece.color, piece.char())] |= mask
+            self.occupied[piece.color] |= mask
+        super().set_piece(row, col, piece)
+
+    def attacks_from(self, row, col) -> int:
+        """Маска клеток, которые атакует фигура из клетки (row, col), без учета цвета фигур на них"""
+        piece = self.field[row][col]
+        square = row * 8 + col
+        char = piece.char()
+        if char == 'P':
+            return PAWN_ATTACK_MASKS[piece.color][square]
+        if char == 'N':
+            return KNIGHT_MASKS[square]
+        if char == 'K':
+            return KING_MASKS[square]
+
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        attacks = 0
+        if char in 'RQ':
+            attacks |= slide_mask(square, occupied, ROOK_RAYS)
+        if char in 'BQ':
+            attacks |= slide_mask(square, occupied, BISHOP_RAYS)
+        return attacks
+
+    def get_targets(self, row, col) -> list[tuple[int, int]]:
+        piece = self.field[row][col]
+        color = piece.color
+
+        if not isinstance(piece, Pawn):
+            return mask_to_cells(self.attacks_from(row, col) & ~self.occupied[color])
+
+        empty = ~(self.occupied[WHITE] | self.occupied[BLACK])
+        square = row * 8 + col
+        if color == WHITE:
+            one_step = (1 << (square + 8)) & empty
+            two_steps = (one_step << 8) & empty if row == 1 else 0
+        else:
+            one_step = (1 << square >> 8) & empty
+            two_steps = (one_step >> 8) & empty if row == 6 else 0
+
+        targets = mask_to_cells(one_step | two_steps | self.attacks_from(row, col) & self.occupied[opponent(color)])
+
+        # Взятие на проходе: рядом стоит пешка противника, которую можно взять
+        if self.en_passant_square is not None:
+            row2, col2 = self.en_passant_square
+            row1 = row + (1 if color == WHITE else -1)
+            if row2 == row and abs(col2 - col) == 1 and piece.can_make_en_passant(self, row, col, row1, col2):
+                targets.append((row1, col2))
+
+        return targets
+
+    def possible_move(self, row, col, row1, col1) -> bool:
+        if self.game_over():
+            return False  # Игра уже закончилась
+
+        if not correct_cords(row, col) or not correct_cords(row1, col1):
+            return False  # Неправильные координаты
+
+        piece: Piece | None = self.field[row][col]
+        if piece is None or piece.get_color() != self.color:
+            return False  # нельзя пойти без фигуры или чужой фигурой
+
+        if (row1, col1) not in self.get_targets(row, col):
+            return False  # фигура не может пойти по своему правилу
+
+        return not self.player_checks_himself(row, col, row1, col1)
+
+    def square_attacked_by(self, square, color) -> bool:
+        row, col = square
+        index = row * 8 + col
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        bitboards = self.bitboards
+
+        # Пешка цвета color атакует клетку, если с этой клетки пешка другого цвета атакует пешку
+        if PAWN_ATTACK_MASKS[opponent(color)][index] & bitboards[(color, 'P')]:
+            return True
+        if KNIGHT_MASKS[index] & bitboards[(color, 'N')]:
+            return True
+        if KING_MASKS[index] & bitboards[(color, 'K')]:
+            return True
+
+        queens = bitboards[(color, 'Q')]
+        if slide_mask(index, occupied, ROOK_RAYS) & (bitboards[(color, 'R')] | queens):
+            return True
+        if slide_mask(index, occupied, BISHOP_RAYS) & (bitboards[(color, 'B')] | queens):
+            return True
+
+        return False
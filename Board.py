@@ -7,17 +7,36 @@
 все остальные изменения должны проводиться строго после передачи хода
 (Данный порядок также важен из-за специфичности работы методов,
 они не могут правильно проверять доску до и после передачи хода)
-4. При проверке легальности хода, создается копия доски во избежание изменений в основной доске
+4. При проверке легальности хода он делается на самой доске методом push и сразу отменяется методом pop,
+поэтому push должен запоминать все, что меняется при ходе, включая состояние фигур
 """
+import os
 from copy import deepcopy
 
 from Pieces import Piece, Pawn, Rook, Knight, Bishop, Queen, King
+from Pieces import ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KNIGHT_TARGETS, KING_TARGETS, RAYS
 from colors import WHITE, BLACK, opponent, correct_cords
+from zobrist import PIECE_KEYS, CASTLING_KEYS, EN_PASSANT_KEYS, BLACK_TO_MOVE_KEY
+from notation import square_name, parse_square
+from evaluation import PIECE_SQUARE_SCORES, PHASE_WEIGHTS
+
+PROMOTIONS = {'Q': Queen, 'N': Knight, 'R': Rook, 'B': Bishop}
+PIECES_BY_CHAR = {'P': Pawn, 'N': Knight, 'B': Bishop, 'R': Rook, 'Q': Queen, 'K': King}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+# Причины ничьей (см. get_draw_reason)
+STALEMATE = 'stalemate'
+REPETITION = 'repetition'
+FIFTY_MOVES = 'fifty_moves'
+INSUFFICIENT_MATERIAL = 'insufficient_material'
+# Проверялась ли уже переменная окружения CHESS_PROFILE (см. enable_profiler_once)
+_profiler_checked = False
 
 
 class Board:
     """Доска хранит информацию о положении фигур и контролирует игровой процесс"""
     def __init__(self):
+        if not _profiler_checked:
+            enable_profiler_once()
 
         self.color = WHITE
         self.field: list[list[None | Piece]] = [[None] * 8 for _ in range(8)]
@@ -37,6 +56,157 @@ class Board:
         self.end = False
         self.stalemate = False
         self.winner = None
+        self.draw_reason: None | str = None
+        # Заканчивать ли партию ничьей по повторению позиции, правилу 50 ходов и недостатку материала
+        # Правила выключаются, например, при проверке записанных партий, где игроки могли не требовать ничью
+        self.draw_rules = True
+
+        # Клетки, на которых стоят короли, обновляются при каждом ходе
+        self.kings: dict[int, tuple[int, int]] = {WHITE: (0, 4), BLACK: (7, 4)}
+        # Клетка пешки, которую можно взять на проходе
+        self.en_passant_square: None | tuple[int, int] = None
+        # Записи для отмены сделанных ходов (см. push и pop)
+        self.move_stack: list[tuple] = []
+        # Число полуходов без взятий и ходов пешек и номер хода, как в записи FEN
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Хеш позиции по Зобристу, обновляется при каждом ходе
+        self.hash_key: int = self.compute_hash()
+        # Сколько раз в партии встречалась позиция с данным хешем, для поиска повторений
+        self.position_counts: dict[int, int] = {self.hash_key: 1}
+        # Связки и шахи последней разобранной позиции (см. pins_and_checks): (ключ позиции, результат)
+        self.pins_cache: None | tuple[tuple, tuple] = None
+        # Суммы оценок фигур с точки зрения белых и стадия игры (см. evaluation.py), обновляются при каждом ходе
+        self.middlegame_score, self.endgame_score, self.phase = self.compute_evaluation()
+
+    @staticmethod
+    def create(backend='field', fen=None):
+        """Создать доску с выбранным способом хранения позиции:
+        'field' - список списков фигур, 'bitboard' - битовые маски (см. BitBoard.py)
+        Если передана запись FEN, доска создается в этой позиции, иначе в начальной"""
+        if backend == 'field':
+            board_class = Board
+        elif backend == 'bitboard':
+            from BitBoard import BitBoard
+            board_class = BitBoard
+        else:
+            raise ValueError(f'Неизвестный способ хранения доски: {backend}')
+        return board_class() if fen is None else board_class.from_fen(fen)
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """Создать доску по записи позиции в нотации FEN"""
+        parts = fen.split()
+        if len(parts) == 4:
+            parts += ['0', '1']  # Счетчики ходов необязательны
+        if len(parts) != 6:
+            raise ValueError(f'Неправильная запись FEN: {fen}')
+        placement, side, castling, en_passant, halfmove, fullmove = parts
+
+        rows = placement.split('/')
+        if len(rows) != 8 or side not in ('w', 'b'):
+            raise ValueError(f'Неправильная запись FEN: {fen}')
+
+        board = cls()
+        for row in range(8):
+            for col in range(8):
+                board.set_piece(row, col, None)
+
+        kings = {}
+        king_count = 0
+        for row, line in zip(range(7, -1, -1), rows):
+            col = 0
+            for char in line:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                if char.upper() not in PIECES_BY_CHAR or col > 7:
+                    raise ValueError(f'Неправильная запись FEN: {fen}')
+                color = WHITE if char.isupper() else BLACK
+                piece = PIECES_BY_CHAR[char.upper()](color)
+                if isinstance(piece, (King, Rook)):
+                    piece.remove_castle()
+                if isinstance(piece, King):
+                    kings[color] = (row, col)
+                    king_count += 1
+                board.set_piece(row, col, piece)
+                col += 1
+            if col != 8:
+                raise ValueError(f'Неправильная запись FEN: {fen}')
+
+        if set(kings) != {WHITE, BLACK} or king_count != 2:
+            raise ValueError(f'В позиции должно быть по одному королю каждого цвета: {fen}')
+        board.kings = kings
+        board.color = WHITE if side == 'w' else BLACK
+
+        # Права рокировки возвращаются королю и ладье, которые стоят на своих местах
+        rights = {'K': (WHITE, 0, 7), 'Q': (WHITE, 0, 0), 'k': (BLACK, 7, 7), 'q': (BLACK, 7, 0)}
+        for char in castling.replace('-', ''):
+            if char not in rights:
+                raise ValueError(f'Неправильная запись FEN: {fen}')
+            color, row, rook_col = rights[char]
+            king, rook = board.get_piece(row, 4), board.get_piece(row, rook_col)
+            if isinstance(king, King) and isinstance(rook, Rook) and king.color == rook.color == color:
+                king.castle = True
+                rook.castle = True
+
+        # В FEN указывается поле, через которое перепрыгнула пешка, а доска хранит клетку самой пешки
+        if en_passant != '-':
+            square = parse_square(en_passant)
+            if square is None:
+                raise ValueError(f'Неправильная запись FEN: {fen}')
+            row, col = square
+            row += 1 if row == 2 else -1
+            pawn = board.get_piece(row, col)
+            if isinstance(pawn, Pawn) and pawn.color != board.color:
+                pawn.add_en_passant()
+                board.en_passant_square = (row, col)
+
+        board.halfmove_clock = int(halfmove)
+        board.fullmove_number = int(fullmove)
+
+        for color in (WHITE, BLACK):
+            king = board.get_king(color)
+            king.check = board.square_attacked_by(board.get_king_position(color), opponent(color))
+        # Король игрока, который не ходит, под шахом - такой позиции не бывает, и следующим ходом его можно взять
+        if board.get_king(opponent(board.color)).is_under_check():
+            raise ValueError(f'Король стороны, которая не ходит, под шахом: {fen}')
+
+        board.hash_key = board.compute_hash()
+        board.position_counts = {board.hash_key: 1}
+        board.update_game_over()
+        return board
+
+    def to_fen(self) -> str:
+        """Вернуть запись позиции в нотации FEN"""
+        rows = []
+        for row in range(7, -1, -1):
+            line = ''
+            empty = 0
+            for col in range(8):
+                piece = self.field[row][col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    line += str(empty)
+                    empty = 0
+                line += piece.char() if piece.color == WHITE else piece.char().lower()
+            if empty:
+                line += str(empty)
+            rows.append(line)
+
+        rights = self.castling_rights()
+        castling = ''.join(char for char, right in (('K', (WHITE, 7)), ('Q', (WHITE, 0)),
+                                                   ('k', (BLACK, 7)), ('q', (BLACK, 0))) if right in rights)
+
+        en_passant = '-'
+        if self.en_passant_square is not None:
+            row, col = self.en_passant_square
+            en_passant = square_name(row - 1 if row == 3 else row + 1, col)
+
+        return ' '.join(('/'.join(rows), 'w' if self.color == WHITE else 'b', castling or '-', en_passant,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
 
     def __str__(self):
         res = ['     +----+----+----+----+----+----+----+----+']
@@ -58,10 +228,102 @@ class Board:
         """Вернуть клетку с координатами row col"""
         return self.field[row][col]
 
+    def set_piece(self, row, col, piece: Piece | None) -> None:
+        """Поставить фигуру piece в клетку (row, col) или очистить клетку, если piece = None
+        Все изменения поля во время ходов проходят через этот метод"""
+        square = row * 8 + col
+        old = self.field[row][col]
+        if old is not None:
+            char = old.char()
+            self.hash_key ^= PIECE_KEYS[(old.color, char)][square]
+            middlegame, endgame = PIECE_SQUARE_SCORES[(old.color, char)][square]
+            self.middlegame_score -= middlegame
+            self.endgame_score -= endgame
+            self.phase -= PHASE_WEIGHTS[char]
+        if piece is not None:
+            char = piece.char()
+            self.hash_key ^= PIECE_KEYS[(piece.color, char)][square]
+            middlegame, endgame = PIECE_SQUARE_SCORES[(piece.color, char)][square]
+            self.middlegame_score += middlegame
+            self.endgame_score += endgame
+            self.phase += PHASE_WEIGHTS[char]
+        self.field[row][col] = piece
+
+    def get_hash(self) -> int:
+        """Вернуть 64-битный хеш позиции: расстановка фигур, очередь хода, права рокировки и взятие на проходе"""
+        return self.hash_key
+
+    def castling_rights(self) -> list[tuple[int, int]]:
+        """Вернуть права рокировки в виде списка (цвет, столбец ладьи)
+        Право есть, если король и ладья стоят на своих местах и еще не теряли возможность рокироваться"""
+        rights = []
+        for color, row in ((WHITE, 0), (BLACK, 7)):
+            king = self.field[row][4]
+            if not isinstance(king, King) or king.color != color or not king.castle:
+                continue
+            for rook_col in (7, 0):
+                rook = self.field[row][rook_col]
+                if isinstance(rook, Rook) and rook.color == color and rook.castle:
+                    rights.append((color, rook_col))
+        return rights
+
+    def state_key(self) -> int:
+        """Часть хеша, которая не зависит от расстановки фигур: очередь хода, рокировки и взятие на проходе"""
+        key = BLACK_TO_MOVE_KEY if self.color == BLACK else 0
+        for right in self.castling_rights():
+            key ^= CASTLING_KEYS[right]
+
+        # Взятие на проходе учитывается, только если рядом стоит пешка, которая может взять
+        if self.en_passant_square is not None:
+            row, col = self.en_passant_square
+            pawn = self.field[row][col]
+            for col1 in (col - 1, col + 1):
+                piece = self.field[row][col1] if 0 <= col1 <= 7 else None
+                if isinstance(piece, Pawn) and piece.color != pawn.color:
+                    key ^= EN_PASSANT_KEYS[col]
+                    break
+        return key
+
+    def compute_evaluation(self) -> tuple[int, int, int]:
+        """Посчитать заново суммы оценок фигур для миттельшпиля и эндшпиля и стадию игры, перебрав все клетки"""
+        middlegame_score = endgame_score = phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.field[row][col]
+                if piece is not None:
+                    middlegame, endgame = PIECE_SQUARE_SCORES[(piece.color, piece.char())][row * 8 + col]
+                    middlegame_score += middlegame
+                    endgame_score += endgame
+                    phase += PHASE_WEIGHTS[piece.char()]
+        return middlegame_score, endgame_score, phase
+
+    def compute_hash(self) -> int:
+        """Посчитать хеш позиции заново, перебрав все клетки"""
+        key = self.state_key()
+        for row in range(8):
+            for col in range(8):
+                piece = self.field[row][col]
+                if piece is not None:
+                    key ^= PIECE_KEYS[(piece.color, piece.char())][row * 8 + col]
+        return key
+
+    def get_targets(self, row, col) -> list[tuple[int, int]]:
+        """Вернуть клетки, в которые фигура из клетки (row, col) может пойти по своему правилу"""
+        return self.field[row][col].get_targets(self, row, col)
+
     def current_player_color(self):
         """Вернуть цвет игрока, который сейчас ходит"""
         return self.color
 
+    def get_king_position(self, color) -> tuple[int, int]:
+        """Вернуть клетку, на которой стоит король цвета color"""
+        return self.kings[color]
+
+    def get_king(self, color) -> King:
+        """Вернуть короля цвета color"""
+        row, col = self.kings[color]
+        return self.field[row][col]
+
     def cell(self, row, col):
         """Возвращает строку из двух символов. Если в клетке (row, col)
                 находится фигура, символы цвета и фигуры. Если клетка пуста,
@@ -84,34 +346,175 @@ class Board:
         """Вернуть, закончилась ли игра патом"""
         return self.stalemate
 
-    def remove_en_passant(self) -> None:
-        """После передачи хода с пешек удаляется возможность быть взятыми на проходе"""
+    def get_draw_reason(self) -> None | str:
+        """Вернуть причину ничьей (STALEMATE, REPETITION, FIFTY_MOVES, INSUFFICIENT_MATERIAL) или None"""
+        return self.draw_reason
+
+    def is_repetition(self, count=3) -> bool:
+        """Проверка, встретилась ли текущая позиция в партии count раз"""
+        return self.position_counts.get(self.hash_key, 0) >= count
+
+    def is_fifty_moves(self) -> bool:
+        """Проверка, прошло ли 50 ходов (100 полуходов) без взятий и ходов пешек"""
+        return self.halfmove_clock >= 100
+
+    def is_insufficient_material(self) -> bool:
+        """Проверка, что мат невозможен: у сторон остались только короли, один легкий конь или слон,
+        или только слоны, стоящие на полях одного цвета"""
+        if self.phase > 2:
+            return False  # Есть ладья, ферзь или хотя бы три легкие фигуры; доску перебирать не нужно
+
+        minors = []
         for row in range(8):
             for col in range(8):
-                piece: Piece | None = self.get_piece(row, col)
-
-                if not isinstance(piece, Pawn):
+                piece = self.field[row][col]
+                if piece is None or isinstance(piece, King):
                     continue
+                if not isinstance(piece, (Knight, Bishop)):
+                    return False  # Пешка
+                minors.append((piece, (row + col) % 2))
+
+        if len(minors) <= 1:
+            return True
+        return all(isinstance(piece, Bishop) for piece, _ in minors) and len({shade for _, shade in minors}) == 1
+
+    def push(self, move) -> None:
+        """Сделать ход ((row, col), (row1, col1), promotion) на самой доске без проверки его допустимости
+        Рокировка задается ходом короля на две клетки, взятие на проходе - ходом пешки на пустую клетку по диагонали
+        Все, что меняется при ходе, запоминается в self.move_stack, чтобы ход можно было отменить методом pop"""
+        (row, col), (row1, col1), char = move
+        piece: Piece = self.field[row][col]
+
+        captured_row, captured_col = row1, col1
+        if isinstance(piece, Pawn) and col != col1 and self.field[row1][col1] is None:
+            captured_row = row  # Взятие на проходе
+        captured: Piece | None = self.field[captured_row][captured_col]
+
+        # Состояние фигуры до хода: возможность рокировки или взятия на проходе
+        if isinstance(piece, (King, Rook)):
+            flag = piece.castle
+        elif isinstance(piece, Pawn):
+            flag = piece.en_passant
+        else:
+            flag = None
+
+        en_passant_pawn = None
+        if self.en_passant_square is not None:
+            en_passant_pawn = self.get_piece(*self.en_passant_square)
+
+        kings = (self.get_king(WHITE), self.get_king(BLACK))
+
+        self.move_stack.append((move, piece, flag, captured, captured_row, captured_col,
+                                en_passant_pawn, self.en_passant_square,
+                                [(king, king.check) for king in kings],
+                                self.color, self.end, self.stalemate, self.winner, self.draw_reason, self.hash_key,
+                                self.halfmove_clock, self.fullmove_number))
+
+        # Убираем из хеша старые очередь хода, права рокировки и взятие на проходе, фигуры учтет set_piece
+        self.hash_key ^= self.state_key()
+
+        self.set_piece(row, col, None)
+        if captured is not None:
+            self.set_piece(captured_row, captured_col, None)
+        self.set_piece(row1, col1, piece if char is None else PROMOTIONS[char](piece.get_color()))
 
-                piece: Pawn
+        if isinstance(piece, King) and abs(col1 - col) == 2:
+            # Рокировка: вместе с королем переставляем ладью
+            rook_col, rook_col1 = (7, 5) if col1 == 6 else (0, 3)
+            rook: Rook = self.field[row][rook_col]
+            self.set_piece(row, rook_col, None)
+            self.set_piece(row, rook_col1, rook)
+            rook.remove_castle()
 
-                if self.current_player_color() == piece.get_color():
-                    piece.remove_en_passant()
+        if isinstance(piece, King):
+            self.kings[piece.get_color()] = (row1, col1)
+
+        # Если походила ладья или король, удаляем возможность рокироваться
+        if isinstance(piece, (King, Rook)):
+            piece.remove_castle()
+
+        # После передачи хода с пешки снимается возможность быть взятой на проходе
+        if en_passant_pawn is not None:
+            en_passant_pawn.remove_en_passant()
+        self.en_passant_square = None
+
+        if isinstance(piece, Pawn) and abs(row - row1) == 2:
+            piece.add_en_passant()
+            self.en_passant_square = (row1, col1)
+
+        if isinstance(piece, Pawn) or captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.color == BLACK:
+            self.fullmove_number += 1
 
-    def update(self) -> None:
-        """Обновление доски: С пешек снимается возможность быть взятой на проходе;
-        Проверяется появление шаха после хода;
-        Проверяется, закончилась ли игра;
-        Все действия проводятся строго после передачи хода, ход передается в первую очередь
-        Исключение: Проверка, получил ли шах игрок, которому переходит ход, происходит до передачи хода"""
         self.add_check_to_opponent_player()
         self.color = opponent(self.color)
         self.update_check_for_resembled_player()
-        self.update_game_over()
-        self.remove_en_passant()
+        self.hash_key ^= self.state_key()
+        self.position_counts[self.hash_key] = self.position_counts.get(self.hash_key, 0) + 1
+
+    def pop(self):
+        """Отменить последний ход, сделанный методом push, и вернуть его"""
+        count = self.position_counts[self.hash_key]
+        if count == 1:
+            del self.position_counts[self.hash_key]
+        else:
+            self.position_counts[self.hash_key] = count - 1
 
-    def move_piece(self, row, col, row1, col1) -> None:
-        """Перемещает фигуру из клетки (row, col) в клетку (row1, col1), если это возможно"""
+        (move, piece, flag, captured, captured_row, captured_col,
+         en_passant_pawn, en_passant_square, checks,
+         self.color, self.end, self.stalemate, self.winner, self.draw_reason, hash_key,
+         self.halfmove_clock, self.fullmove_number) = self.move_stack.pop()
+        (row, col), (row1, col1), char = move
+
+        self.set_piece(row1, col1, None)
+        if captured is not None:
+            self.set_piece(captured_row, captured_col, captured)
+        self.set_piece(row, col, piece)
+
+        if isinstance(piece, King) and abs(col1 - col) == 2:
+            rook_col, rook_col1 = (7, 5) if col1 == 6 else (0, 3)
+            rook: Rook = self.field[row][rook_col1]
+            self.set_piece(row, rook_col1, None)
+            self.set_piece(row, rook_col, rook)
+            rook.castle = True  # Без этого права рокировка не могла быть сделана
+
+        if isinstance(piece, King):
+            self.kings[piece.get_color()] = (row, col)
+
+        if isinstance(piece, (King, Rook)):
+            piece.castle = flag
+        elif isinstance(piece, Pawn):
+            piece.en_passant = flag
+
+        if en_passant_pawn is not None:
+            en_passant_pawn.add_en_passant()
+        self.en_passant_square = en_passant_square
+
+        for king, check in checks:
+            king.check = check
+
+        self.hash_key = hash_key
+        return move
+
+    def make_move(self, move) -> bool:
+        """Сделать ход ((row, col), (row1, col1), promotion) по правилам игры, вернуть, удался ли ход"""
+        (row, col), (row1, col1), char = move
+        if char is None:
+            return self.move_piece(row, col, row1, col1)
+        return self.move_and_promote_pawn(row, col, row1, col1, char)
+
+    def reset(self) -> None:
+        """Вернуть доску в позицию, с которой она была создана, отменив все ходы
+        Позволяет использовать одну доску для многих партий, не создавая фигуры заново"""
+        while self.move_stack:
+            self.pop()
+
+    def move_piece(self, row, col, row1, col1) -> bool:
+        """Перемещает фигуру из клетки (row, col) в клетку (row1, col1), если это возможно
+        Возвращает, удался ли ход"""
 
         # Если игрок передвинул короля на две клетки по горизонтали, будет предпринята попытка рокировки
         castling7_condition = ({row, row1} < {0, 7},
@@ -124,38 +527,18 @@ class Board:
                                col == 4,
                                col1 == 2)
 
-        if all(castling7_condition):
-            self.castling7()
+        if all(castling7_condition) and self.castling7():
+            return True
 
-        if all(castling0_condition):
-            self.castling0()
+        if all(castling0_condition) and self.castling0():
+            return True
 
         if not self.possible_move(row, col, row1, col1):
-            return None
-
-        piece: Piece = self.field[row][col]
-
-        if isinstance(piece, Pawn):
-            piece: Pawn
-            if piece.can_make_en_passant(self, row, col, row1, col1):
-                if not (self.player_checks_himself(row, col, row1, col1)):
-                    self.field[row][col] = None
-                    self.field[row1][col1] = piece
-                    self.field[row][col1] = None
-                    self.update()
-                return None
-            elif abs(row - row1) == 2:
-                piece.add_en_passant()
-
-        self.field[row][col] = None  # Снять фигуру.
-        self.field[row1][col1] = piece  # Поставить на новое место.
-
-        # Если походила ладья или король, удаляем возможность рокироваться
-        if isinstance(piece, (King, Rook)):
-            piece: King | Rook
-            piece.remove_castle()
+            return False
 
-        self.update()
+        self.push(((row, col), (row1, col1), None))
+        self.update_game_over()
+        return True
 
     def possible_move(self, row, col, row1, col1) -> bool:
         """Возвращает, возможно ли сделать ход из клетки (row, col) в клетку (row1, col1)"""
@@ -166,68 +549,96 @@ class Board:
         if not correct_cords(row, col) or not correct_cords(row1, col1):
             return False  # Неправильные координаты
 
-        board_copy = self.get_full_copy()
-
-        piece: Piece | None = board_copy.field[row][col]
+        piece: Piece | None = self.field[row][col]
         if piece is None:
             return False  # нельзя пойти без фигуры
 
-        if piece.get_color() != board_copy.color:
+        if piece.get_color() != self.color:
             return False  # игрок ходит не своим цветом
 
-        target_cell = board_copy.get_piece(row1, col1)
-        if not (target_cell is None) and target_cell.get_color() == board_copy.current_player_color():
+        target_cell = self.get_piece(row1, col1)
+        if not (target_cell is None) and target_cell.get_color() == self.current_player_color():
             return False  # игрок пытается взять фигуру своего цвета
 
         if isinstance(piece, Pawn):
             piece: Pawn
-            if piece.can_make_en_passant(board_copy, row, col, row1, col1):
-                if board_copy.player_checks_himself(row, col, row1, col1):
+            if piece.can_make_en_passant(self, row, col, row1, col1):
+                if self.player_checks_himself(row, col, row1, col1):
                     return False  # игрок подставляет своего короля под шах
                 else:
                     return True
 
-        if not piece.can_move(board_copy, row, col, row1, col1) and board_copy.get_piece(row1, col1) is None:
+        if not piece.can_move(self, row, col, row1, col1) and self.get_piece(row1, col1) is None:
             return False  # фигура не может пойти по своему правилу
 
-        elif not piece.can_attack(board_copy, row, col, row1, col1) and not (board_copy.get_piece(row1, col1) is None):
+        elif not piece.can_attack(self, row, col, row1, col1) and not (self.get_piece(row1, col1) is None):
             return False  # фигура не может атаковать по своему правилу
 
-        if board_copy.player_checks_himself(row, col, row1, col1):
+        if self.player_checks_himself(row, col, row1, col1):
             return False  # игрок подставляет своего короля под шах
 
         return True
 
-    def move_and_promote_pawn(self, row, col, row1, col1, char) -> None:
-        """Превращение пешки"""
+    def move_and_promote_pawn(self, row, col, row1, col1, char) -> bool:
+        """Превращение пешки, возвращает, удался ли ход"""
 
-        promotes = {'Q': Queen, 'N': Knight, 'R': Rook, 'B': Bishop}
-        if char not in promotes:
-            return None  # Выбрана неправильная фигура для превращения
+        if char not in PROMOTIONS:
+            return False  # Выбрана неправильная фигура для превращения
 
         if not self.possible_move(row, col, row1, col1):
-            return None  # Невозможный ход
+            return False  # Невозможный ход
 
-        self.field[row1][col1] = promotes[char](self.get_piece(row, col).get_color())
-        self.field[row][col] = None
-        self.update()
+        self.push(((row, col), (row1, col1), char))
+        self.update_game_over()
+        return True
 
     def is_under_attack(self, row1, col1) -> bool:
-        """Проверка на то, что как минимум одна фигура цвета color может атаковать данную клетку"""
-        # (Так как мы условились, что фигура не может атаковать в свой ход, то параметр color утратил смысл)
-        for row in range(8):
-            for col in range(8):
-
-                if row == row1 and col == col1:
-                    continue
-
-                piece = self.get_piece(row, col)
-
-                if piece is None:
-                    continue  # В данной клетке нет фигуры
-
-                if piece.can_attack(self, row, col, row1, col1):
-                    return True
+        """Проверка на то, что как минимум одна фигура игрока, который сейчас ходит, может атаковать данную клетку"""
+        # (Так как мы условились, что фигура не может атаковать в свой ход, то атакует всегда текущий игрок)
+        return self.square_attacked_by((row1, col1), self.current_player_color())
+
+    def square_attacked_by(self, square, color) -> bool:
+        """Проверка, атакует ли хотя бы одна фигура цвета color клетку square = (row, col)
+        Поиск идет от самой клетки: по восьми лучам ищутся ладьи, слоны и ферзи,
+        затем проверяются прыжки коня, диагонали пешек и соседние с клеткой поля короля"""
+        row, col = square
+        index = row * 8 + col
+        field = self.field
+
+        for direction in ROOK_DIRECTIONS:
+            for row1, col1 in RAYS[direction][index]:
+                piece = field[row1][col1]
+                if piece is not None:
+                    if piece.color == color and isinstance(piece, (Rook, Queen)):
+                        return True
+                    break
+
+        for direction in BISHOP_DIRECTIONS:
+            for row1, col1 in RAYS[direction][index]:
+                piece = field[row1][col1]
+                if piece is not None:
+                    if piece.color == color and isinstance(piece, (Bishop, Queen)):
+                        return True
+                    break
+
+        for row1, col1 in KNIGHT_TARGETS[index]:
+            piece = field[row1][col1]
+            if piece is not None and piece.color == color and isinstance(piece, Knight):
+                return True
+
+        # Пешка цвета color атакует клетку, если стоит на одну строку позади нее по своему направлению
+        row1 = row - 1 if color == WHITE else row + 1
+        if 0 <= row1 <= 7:
+            for col1 in (col - 1, col + 1):
+                if 0 <= col1 <= 7:
+                    piece = field[row1][col1]
+                    if piece is not None and piece.color == color and isinstance(piece, Pawn):
+                        return True
+
+        for row1, col1 in KING_TARGETS[index]:
+            piece = field[row1][col1]
+            if piece is not None and piece.color == color and isinstance(piece, King):
+                return True
 
         return False
 
@@ -236,11 +647,9 @@ class Board:
         if self.game_over():
             return False
 
-        board_copy = self.get_full_copy()
-
-        row = 0 if board_copy.current_player_color() == WHITE else 7
-        rook: Rook | None = board_copy.get_piece(row, 0)
-        king: King | None = board_copy.get_piece(row, 4)
+        row = 0 if self.current_player_color() == WHITE else 7
+        rook: Rook | None = self.get_piece(row, 0)
+        king: King | None = self.get_piece(row, 4)
 
         # на 0 вертикали нет ладьи или она не может рокироваться
         if not isinstance(rook, Rook) or not rook.can_castle():
@@ -250,48 +659,38 @@ class Board:
         if not isinstance(king, King) or not king.can_castle():
             return False
 
-        board_copy.color = opponent(board_copy.color)
-        # Между королем и ладьей не должно быть фигур, и поля не должны быть атакованы
-        conditions = (board_copy.get_piece(row, 1) is None,
-                      board_copy.get_piece(row, 2) is None,
-                      board_copy.get_piece(row, 3) is None,
-                      not board_copy.is_under_attack(row, 1),
-                      not board_copy.is_under_attack(row, 2),
-                      not board_copy.is_under_attack(row, 3))
+        enemy = opponent(self.current_player_color())
+        # Между королем и ладьей не должно быть фигур, а поля, через которые проходит король, не должны быть атакованы
+        # (поле рядом с ладьей король не проходит, поэтому оно может быть атаковано)
+        conditions = (self.get_piece(row, 1) is None,
+                      self.get_piece(row, 2) is None,
+                      self.get_piece(row, 3) is None,
+                      not self.square_attacked_by((row, 2), enemy),
+                      not self.square_attacked_by((row, 3), enemy))
 
         if not all(conditions):
             return False
 
         return True
 
-    def castling0(self) -> None:
-        """Рокировка на ферзевом фланге"""
+    def castling0(self) -> bool:
+        """Рокировка на ферзевом фланге, возвращает, удалась ли она"""
         if not self.possible_castling0():
-            return None
+            return False
 
         row = 0 if self.current_player_color() == WHITE else 7
-        rook: Rook | None = self.get_piece(row, 0)
-        king: King | None = self.get_piece(row, 4)
-
-        self.field[row][4] = None
-        self.field[row][0] = None
-        self.field[row][2] = king
-        self.field[row][3] = rook
-
-        king.remove_castle()
-        rook.remove_castle()
-        self.update()
+        self.push(((row, 4), (row, 2), None))
+        self.update_game_over()
+        return True
 
     def possible_castling7(self) -> bool:
         """Возвращает, возможно ли выполнить короткую рокировку"""
         if self.game_over():
             return False
 
-        board_copy = self.get_full_copy()
-
-        row = 0 if board_copy.current_player_color() == WHITE else 7
-        rook: Rook | None = board_copy.get_piece(row, 7)
-        king: King | None = board_copy.get_piece(row, 4)
+        row = 0 if self.current_player_color() == WHITE else 7
+        rook: Rook | None = self.get_piece(row, 7)
+        king: King | None = self.get_piece(row, 4)
 
         # на 7 вертикали нет ладьи или она не может рокироваться
         if not isinstance(rook, Rook) or not rook.can_castle():
@@ -301,164 +700,197 @@ class Board:
         if not isinstance(king, King) or not king.can_castle():
             return False
 
-        board_copy.color = opponent(board_copy.color)
+        enemy = opponent(self.current_player_color())
         # Между королем и ладьей не должно быть фигур, и поля не должны быть атакованы
-        conditions = (board_copy.get_piece(row, 5) is None,
-                      board_copy.get_piece(row, 6) is None,
-                      not board_copy.is_under_attack(row, 5),
-                      not board_copy.is_under_attack(row, 6))
+        conditions = (self.get_piece(row, 5) is None,
+                      self.get_piece(row, 6) is None,
+                      not self.square_attacked_by((row, 5), enemy),
+                      not self.square_attacked_by((row, 6), enemy))
 
         if not all(conditions):
             return False
 
         return True
 
-    def castling7(self) -> None:
-        """Рокировка на королевском фланге"""
+    def castling7(self) -> bool:
+        """Рокировка на королевском фланге, возвращает, удалась ли она"""
         if not self.possible_castling7():
-            return None
+            return False
 
         row = 0 if self.current_player_color() == WHITE else 7
-        rook: Rook | None = self.get_piece(row, 7)
-        king: King | None = self.get_piece(row, 4)
-
-        self.field[row][4] = None
-        self.field[row][7] = None
-        self.field[row][6] = king
-        self.field[row][5] = rook
-        king.remove_castle()
-        rook.remove_castle()
-
-        self.update()
+        self.push(((row, 4), (row, 6), None))
+        self.update_game_over()
+        return True
 
     def add_check_to_opponent_player(self) -> None:
         """Наложить шах на игрока, которому после хода он переходит
         Примечание: Метод должен выполняться до передачи хода"""
-        for row in range(8):
-            for col in range(8):
-                piece: Piece | None = self.get_piece(row, col)
-
-                if not isinstance(piece, King):
-                    continue
-
-                piece: King
-
-                if piece.get_color() == self.current_player_color():
-                    continue
-
-                # После того как мы нашли клетку, где стоит король нужного цвета, проверяем, атакован ли он
-                if self.is_under_attack(row, col):
-                    piece.add_check()
+        row, col = self.get_king_position(opponent(self.current_player_color()))
 
-                # Так как король нужного цвета уже был найден, дальнейшая работа функции не имеет смысла
-                return None
+        if self.is_under_attack(row, col):
+            self.get_piece(row, col).add_check()
 
     def update_check_for_resembled_player(self) -> None:
         """Обновить шах у игрока, который передал ход
         Примечание: Метод должен выполняться после передачи хода"""
+        row, col = self.get_king_position(opponent(self.current_player_color()))
+        king: King = self.get_piece(row, col)
 
-        for row in range(8):
-            for col in range(8):
-                piece: Piece | None = self.get_piece(row, col)
-
-                if not isinstance(piece, King):
-                    continue
-
-                piece: King
-
-                if piece.get_color() == self.current_player_color():
-                    continue
-
-                # На этом моменте найден король нужного цвета
-                if self.is_under_attack(row, col) and not piece.is_under_check():
-                    # Если игрок подставил своего короля под шах, добавляем шах
-                    piece.add_check()
-                elif not self.is_under_attack(row, col) and piece.is_under_check():
-                    # Если игрок убрал своего короля из-под шаха, удаляем шах
-                    piece.remove_check()
-
-                # Если король был под шахом и под ним остался, метод ничего не изменит, король так и останется под шахом
-                # Так как король нужного цвета уже был найден, дальнейшая работа функции не имеет смысла
-                return None
+        # Если игрок подставил своего короля под шах, добавляем шах,
+        # если убрал своего короля из-под шаха, удаляем шах
+        if self.is_under_attack(row, col):
+            king.add_check()
+        else:
+            king.remove_check()
 
     def check_on_board(self) -> bool:
         """Проверка, находится ли король игрока, которому перешел ход, под шахом"""
-        for row in range(8):
-            for col in range(8):
-                piece: Piece | None = self.get_piece(row, col)
-
-                if not isinstance(piece, King):
-                    continue
-
-                piece: King
-
-                if piece.get_color() == opponent(self.current_player_color()):
-                    continue
-
-                if piece.is_under_check():
-                    return True
-                else:
-                    return False
+        return self.get_king(self.current_player_color()).is_under_check()
 
     def player_checks_himself(self, row, col, row1, col1) -> bool:
         """Проверка, подставляет ли игрок своим ходом своего короля под шах
         Примечание: в данный метод должен передаваться ход, который фигура может сделать по своему правилу"""
 
-        # Сохраняем старое поле и делаем ход
-
         piece: Piece | None = self.get_piece(row, col)
 
         if piece is None:
             return False
 
-        new_board = self.get_full_copy()
-
-        new_board.field[row1][col1] = piece
-        new_board.field[row][col] = None
-        new_board.color = opponent(new_board.color)
-        new_board.update_check_for_resembled_player()
-
-        for row2 in range(8):
-            for col2 in range(8):
-                piece: Piece | None = new_board.get_piece(row2, col2)
-
-                if not isinstance(piece, King):
-                    continue
-
-                piece: King
-
-                if piece.get_color() == new_board.current_player_color():
-                    continue
-
-                # Проверяем, находится ли король игрока, передавшего ход, под шахом в новом поле
-                if piece.is_under_check():
-                    return True
-                else:
-                    return False
+        # Ход короля и взятие на проходе проверяются пробным ходом: король уходит из-под шаха сам,
+        # а при взятии на проходе с горизонтали короля пропадают сразу две пешки
+        if isinstance(piece, King) or (isinstance(piece, Pawn) and col != col1 and self.field[row1][col1] is None):
+            # Делаем ход на доске, проверяем шах короля игрока, передавшего ход, и отменяем ход
+            self.push(((row, col), (row1, col1), None))
+            in_check = self.get_king(piece.get_color()).is_under_check()
+            self.pop()
+            return in_check
+
+        pins, checks = self.pins_and_checks(piece.get_color())
+        # От двойного шаха не закрыться и обе фигуры не взять: ходить можно только королем
+        if len(checks) > 1:
+            return True
+        # При шахе ход должен взять шахующую фигуру или встать между ней и королем
+        if checks and (row1, col1) not in checks[0]:
+            return True
+        # Связанная фигура может ходить только по лучу между королем и связывающей фигурой
+        return (row, col) in pins and (row1, col1) not in pins[(row, col)]
+
+    def pins_and_checks(self, color) -> tuple[dict, list]:
+        """Связки и шахи короля цвета color
+        Возвращает словарь {клетка связанной фигуры: клетки луча от короля до связывающей фигуры включительно}
+        и список шахующих фигур, для каждой - множество клеток, ходом на которые ее берут или закрываются от нее.
+        Результат запоминается, пока позиция не изменится"""
+
+        key = (self.hash_key, len(self.move_stack), color)
+        if self.pins_cache is not None and self.pins_cache[0] == key:
+            return self.pins_cache[1]
+
+        field = self.field
+        king_row, king_col = self.kings[color]
+        king_index = king_row * 8 + king_col
+        pins: dict[tuple[int, int], set] = {}
+        checks: list[set] = []
+
+        # Идем по лучам от короля: первая чужая дальнобойная фигура на луче шахует,
+        # а если перед ней стоит ровно одна своя фигура, то эта фигура связана
+        for directions, sliders in ((ROOK_DIRECTIONS, (Rook, Queen)), (BISHOP_DIRECTIONS, (Bishop, Queen))):
+            for direction in directions:
+                ray = RAYS[direction][king_index]
+                blocker = None
+                for i, (row, col) in enumerate(ray):
+                    piece = field[row][col]
+                    if piece is not None:
+                        if piece.get_color() == color:
+                            if blocker is not None:
+                                break
+                            blocker = (row, col)
+                        else:
+                            if isinstance(piece, sliders):
+                                if blocker is None:
+                                    checks.append(set(ray[:i + 1]))
+                                else:
+                                    pins[blocker] = set(ray[:i + 1])
+                            break
+
+        for row, col in KNIGHT_TARGETS[king_index]:
+            piece = field[row][col]
+            if isinstance(piece, Knight) and piece.get_color() != color:
+                checks.append({(row, col)})
+
+        # Пешки бьют вперед по диагонали, то есть стоят на ряд впереди короля со стороны соперника
+        pawn_row = king_row + (1 if color == WHITE else -1)
+        for pawn_col in (king_col - 1, king_col + 1):
+            if correct_cords(pawn_row, pawn_col):
+                piece = field[pawn_row][pawn_col]
+                if isinstance(piece, Pawn) and piece.get_color() != color:
+                    checks.append({(pawn_row, pawn_col)})
+
+        self.pins_cache = (key, (pins, checks))
+        return pins, checks
 
     def current_player_can_do_any_move(self) -> bool:
         """Проверка, может ли игрок, которому перешел ход, сделать его"""
-        board_copy = self.get_full_copy()
+        return next(self.legal_moves(), None) is not None
+
+    def legal_moves(self, captures_only=False):
+        """Генератор всех допустимых ходов игрока, который сейчас ходит.
+        Ход возвращается в виде ((row, col), (row1, col1), promotion),
+        где promotion - символ фигуры превращения ('Q', 'R', 'B', 'N') или None
+        Если captures_only = True, перебираются только взятия и превращения пешек"""
         for row in range(8):
             for col in range(8):
-                piece = board_copy.get_piece(row, col)
+                yield from self.legal_moves_from(row, col, captures_only)
 
-                if piece is None:
-                    continue
+    def legal_moves_from(self, row, col, captures_only=False):
+        """Генератор допустимых ходов фигуры из клетки (row, col)
+        Каждая фигура перебирает только клетки по своему правилу, после чего проверяется шах своему королю"""
+        if self.game_over():
+            return None
+
+        piece: Piece | None = self.get_piece(row, col)
+        if piece is None or piece.get_color() != self.current_player_color():
+            return None
 
-                if piece.get_color() != board_copy.current_player_color():
+        final_row = 7 if piece.get_color() == WHITE else 0
+        for row1, col1 in self.get_targets(row, col):
+            if captures_only and self.field[row1][col1] is None:
+                # Взятие на проходе и превращение тоже считаются
+                if not isinstance(piece, Pawn) or (col1 == col and row1 != final_row):
                     continue
 
-                if piece.can_do_any_move(board_copy, row, col):
-                    return True
+            if self.player_checks_himself(row, col, row1, col1):
+                continue
 
-        return False
+            if isinstance(piece, Pawn) and row1 == final_row:
+                for char in 'QRBN':
+                    yield (row, col), (row1, col1), char
+            else:
+                yield (row, col), (row1, col1), None
+
+        # Рокировки перебираются отдельно, так как король не может пойти на две клетки по своему правилу
+        if isinstance(piece, King) and col == 4 and not captures_only:
+            if self.possible_castling7():
+                yield (row, col), (row, 6), None
+            if self.possible_castling0():
+                yield (row, col), (row, 2), None
 
     def update_game_over(self) -> None:
         """Если после передачи хода игра по правилам заканчивается, объявляем победителя или пат"""
 
         if self.current_player_can_do_any_move():
-            return None  # У игрока еще есть допустимые ходы
+            # У игрока еще есть допустимые ходы, но партия может закончиться ничьей по правилам
+            if not self.draw_rules:
+                return None
+            if self.is_repetition():
+                self.draw_reason = REPETITION
+            elif self.is_fifty_moves():
+                self.draw_reason = FIFTY_MOVES
+            elif self.is_insufficient_material():
+                self.draw_reason = INSUFFICIENT_MATERIAL
+            else:
+                return None
+            self.end = True
+            return None
 
         # Объявляем конец игры вместе с победителем или патом
         self.end = True
@@ -466,15 +898,19 @@ class Board:
             self.winner = opponent(self.current_player_color())
         else:
             self.stalemate = True
+            self.draw_reason = STALEMATE
 
     def get_full_copy(self):
         """Возвращает копию доски"""
-        new_board = Board()
-        for row in range(8):
-            for col in range(8):
-                new_board.field[row][col] = deepcopy(self.get_piece(row, col))
-        new_board.color = deepcopy(self.color)
-        new_board.end = deepcopy(self.end)
-        new_board.stalemate = deepcopy(self.stalemate)
-        new_board.winner = deepcopy(self.winner)
-        return new_board
+        return deepcopy(self)
+
+
+def enable_profiler_once() -> None:
+    """Включить счетчики вызовов, если задана переменная окружения CHESS_PROFILE (см. profiler.py)
+    Вызывается при создании первой доски: пока загружается Board.py, BitBoard.py и profiler.py
+    еще не загружены, и подменить их методы нельзя"""
+    global _profiler_checked
+    _profiler_checked = True
+    if os.environ.get('CHESS_PROFILE'):
+        from profiler import enable_from_environment
+        enable_from_environment()
@@ -7,6 +7,65 @@
 
 from colors import WHITE, BLACK, correct_cords, opponent
 
+# Направления движения и прыжки фигур в виде (изменение строки, изменение столбца)
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_JUMPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = QUEEN_DIRECTIONS
+
+
+def jump_cells(jumps) -> list[tuple[tuple[int, int], ...]]:
+    """Для каждой клетки (номер row * 8 + col) клетки, в которые можно попасть одним прыжком"""
+    cells = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        cells.append(tuple((row + d_row, col + d_col) for d_row, d_col in jumps
+                           if correct_cords(row + d_row, col + d_col)))
+    return cells
+
+
+def ray_cells(d_row, d_col) -> list[tuple[tuple[int, int], ...]]:
+    """Для каждой клетки клетки луча в направлении (d_row, d_col) до края доски, начиная с ближней"""
+    cells = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        ray = []
+        row, col = row + d_row, col + d_col
+        while correct_cords(row, col):
+            ray.append((row, col))
+            row, col = row + d_row, col + d_col
+        cells.append(tuple(ray))
+    return cells
+
+
+def between_cells(directions) -> list[dict[int, tuple[tuple[int, int], ...]]]:
+    """Для каждой клетки словарь {клетка на одном из лучей directions: клетки строго между ними}
+    Клеток, не лежащих на этих лучах, в словаре нет"""
+    cells = []
+    for square in range(64):
+        between = {}
+        for direction in directions:
+            ray = RAYS[direction][square]
+            for i, (row, col) in enumerate(ray):
+                between[row * 8 + col] = ray[:i]
+        cells.append(between)
+    return cells
+
+
+# Таблицы строятся один раз при загрузке модуля, клетка в них задается номером row * 8 + col
+KNIGHT_TARGETS = jump_cells(KNIGHT_JUMPS)
+KING_TARGETS = jump_cells(KING_STEPS)
+# Клетки, которые бьет пешка цвета color
+PAWN_CAPTURE_TARGETS = {WHITE: jump_cells(((1, -1), (1, 1))), BLACK: jump_cells(((-1, -1), (-1, 1)))}
+# Те же клетки множествами: проверка хода коня и короля - один поиск в множестве
+KNIGHT_TARGET_SETS = [frozenset(cells) for cells in KNIGHT_TARGETS]
+KING_TARGET_SETS = [frozenset(cells) for cells in KING_TARGETS]
+RAYS = {direction: ray_cells(*direction) for direction in QUEEN_DIRECTIONS}
+ROOK_BETWEEN = between_cells(ROOK_DIRECTIONS)
+BISHOP_BETWEEN = between_cells(BISHOP_DIRECTIONS)
+QUEEN_BETWEEN = between_cells(QUEEN_DIRECTIONS)
+
 
 class Piece:
     """Основная конструкция фигуры"""
@@ -64,13 +123,39 @@ class Piece:
         """Вернуть обозначение фигуры"""
         return self.__class__.__name__[0]
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        """Вернуть клетки, в которые фигура может пойти или которые может атаковать по своему правилу
+        Шахи не проверяются, это делает класс Board"""
+        return []
+
+    def slide_targets(self, board, row, col, directions) -> list[tuple[int, int]]:
+        """Клетки на лучах из клетки (row, col) до первой фигуры включительно, если она чужого цвета"""
+        targets = []
+        square = row * 8 + col
+        for direction in directions:
+            for row1, col1 in RAYS[direction][square]:
+                piece = board.get_piece(row1, col1)
+                if piece is not None:
+                    if piece.get_color() != self.color:
+                        targets.append((row1, col1))
+                    break
+                targets.append((row1, col1))
+        return targets
+
+    def jump_targets(self, board, row, col, jumps) -> list[tuple[int, int]]:
+        """Клетки, в которые фигура попадает одним прыжком, если там нет фигуры своего цвета
+        jumps - таблица клеток прыжков (KNIGHT_TARGETS или KING_TARGETS)"""
+        targets = []
+        for row1, col1 in jumps[row * 8 + col]:
+            piece = board.get_piece(row1, col1)
+            if piece is None or piece.get_color() != self.color:
+                targets.append((row1, col1))
+        return targets
+
     @staticmethod
     def can_do_any_move(board, row, col):
         """Проверка, может ли фигура сделать хотя бы один ход"""
-        for row1 in range(8):
-            for col1 in range(8):
-                if board.possible_move(row, col, row1, col1):
-                    return True
+        return next(board.legal_moves_from(row, col), None) is not None
 
     def __repr__(self):
         return self.char()
@@ -107,7 +192,6 @@ class Pawn(Piece):
 
         # Фигур на пути пешки не должно быть
         if row + direction == row1 and board.get_piece(row + direction, col) is None:
-            self.en_passant = False
             return True
 
         elif not 0 <= row + 2 * direction <= 7:
@@ -117,7 +201,7 @@ class Pawn(Piece):
         elif all((row + 2 * direction == row1,
                   board.get_piece(row + direction, col) is None,
                   board.get_piece(row + 2 * direction, col) is None)):
-            self.add_en_passant()
+            # Возможность взятия на проходе добавляет доска, когда ход действительно сделан
             return True
 
     def can_attack(self, board, row, col, row1, col1) -> bool:
@@ -129,6 +213,37 @@ class Pawn(Piece):
         direction = 1 if (self.color == WHITE) else -1
         return row + direction == row1 and abs(col - col1) == 1
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        """Ход вперед на одну или две клетки, взятие по диагонали и взятие на проходе"""
+        if self.get_color() == WHITE:
+            direction = 1
+            start_row = 1
+        else:
+            direction = -1
+            start_row = 6
+
+        targets = []
+        row1 = row + direction
+        if not 0 <= row1 <= 7:
+            return targets
+
+        if board.get_piece(row1, col) is None:
+            targets.append((row1, col))
+            if row == start_row and board.get_piece(row1 + direction, col) is None:
+                targets.append((row1 + direction, col))
+
+        for col1 in (col - 1, col + 1):
+            if not 0 <= col1 <= 7:
+                continue
+            piece = board.get_piece(row1, col1)
+            if piece is not None:
+                if piece.get_color() != self.color:
+                    targets.append((row1, col1))
+            elif self.can_make_en_passant(board, row, col, row1, col1):
+                targets.append((row1, col1))
+
+        return targets
+
     def can_make_en_passant(self, board, row, col, row1, col1) -> bool:
         """Взятие на проходе"""
         if self.get_color() == WHITE:
@@ -176,22 +291,15 @@ class Rook(Piece):
         if not super().can_move(board, row, col, row1, col1):
             return False
 
-        if row != row1 and col != col1:
+        # Клетки нет в таблице, если она не на одной строке или столбце с ладьей
+        between = ROOK_BETWEEN[row * 8 + col].get(row1 * 8 + col1)
+        if between is None:
             return False
 
-        if row != row1:
-            step = 1 if (row1 >= row) else -1
-            for r in range(row + step, row1, step):
-                # Если на пути по горизонтали есть фигура
-                if not (board.get_piece(r, col) is None):
-                    return False
-
-        else:
-            step = 1 if (col1 >= col) else -1
-            for c in range(col + step, col1, step):
-                # Если на пути по вертикали есть фигура
-                if not (board.get_piece(row, c) is None):
-                    return False
+        # На пути не должно быть фигур
+        for r, c in between:
+            if board.get_piece(r, c) is not None:
+                return False
 
         return True
 
@@ -201,6 +309,9 @@ class Rook(Piece):
 
         return self.can_move(board, row, col, row1, col1)
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        return self.slide_targets(board, row, col, ROOK_DIRECTIONS)
+
     def can_castle(self) -> bool:
         """Проверка может ли ладья рокироваться"""
         return self.castle
@@ -223,10 +334,7 @@ class Knight(Piece):
         if not super().can_move(board, row, col, row1, col1):
             return False
 
-        if {abs(row - row1), abs(col - col1)} == {1, 2}:
-            return True
-
-        return False
+        return (row1, col1) in KNIGHT_TARGET_SETS[row * 8 + col]
 
     def can_attack(self, board, row, col, row1, col1) -> bool:
         if not super().can_attack(board, row, col, row1, col1):
@@ -234,6 +342,9 @@ class Knight(Piece):
 
         return self.can_move(board, row, col, row1, col1)
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        return self.jump_targets(board, row, col, KNIGHT_TARGETS)
+
 
 class Bishop(Piece):
     """Слон"""
@@ -242,24 +353,15 @@ class Bishop(Piece):
         if not super().can_move(board, row, col, row1, col1):
             return False
 
-        if abs(row - row1) != abs(col - col1):
+        # Клетки нет в таблице, если она не на одной диагонали со слоном
+        between = BISHOP_BETWEEN[row * 8 + col].get(row1 * 8 + col1)
+        if between is None:
             return False
 
-        # Движение по главной диагонали(от левого верхнего угла к правому нижнему и наоборот)
-        if (row - row1) // abs(row - row1) == (col - col1) // abs(col - col1):
-            step = 1 if row1 >= row else -1
-            for i, j in zip(range(row + step, row1, step), range(col + step, col1, step)):
-                # Если на пути есть фигура
-                if not (board.get_piece(i, j) is None):
-                    return False
-
-        # Движение по побочной диагонали(от правого верхнего угла к левому нижнему и наоборот)
-        else:
-            step = 1 if (row1 >= row) else -1
-            for i, j in zip(range(row + step, row1, step), range(col - step, col1, -step)):
-                # Если на пути есть фигура
-                if not (board.get_piece(i, j) is None):
-                    return False
+        # На пути не должно быть фигур
+        for r, c in between:
+            if board.get_piece(r, c) is not None:
+                return False
 
         return True
 
@@ -269,6 +371,9 @@ class Bishop(Piece):
 
         return self.can_move(board, row, col, row1, col1)
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        return self.slide_targets(board, row, col, BISHOP_DIRECTIONS)
+
 
 class Queen(Piece):
     """Ферзь"""
@@ -279,39 +384,15 @@ class Queen(Piece):
         if not super().can_move(board, row, col, row1, col1):
             return False
 
-        if row != row1 and col != col1:
-            if abs(row - row1) != abs(col - col1):
-                return False
-
-            # Движение по главной диагонали(от левого верхнего угла к правому нижнему и наоборот)
-            if (row - row1) // abs(row - row1) == (col - col1) // abs(col - col1):
-                step = 1 if row1 >= row else -1
-                for i, j in zip(range(row + step, row1, step), range(col + step, col1, step)):
-                    # Если на пути есть фигура
-                    if not (board.get_piece(i, j) is None):
-                        return False
-
-            # Движение по побочной диагонали(от правого верхнего угла к левому нижнему и наоборот)
-            else:
-                step = 1 if (row1 >= row) else -1
-                for i, j in zip(range(row + step, row1, step), range(col - step, col1, -step)):
-                    # Если на пути есть фигура
-                    if not (board.get_piece(i, j) is None):
-                        return False
-
-        elif row != row1:
-            step = 1 if (row1 >= row) else -1
-            for r in range(row + step, row1, step):
-                # Если на пути по горизонтали есть фигура
-                if not (board.get_piece(r, col) is None):
-                    return False
+        # Клетки нет в таблице, если она не на одной строке, столбце или диагонали с ферзем
+        between = QUEEN_BETWEEN[row * 8 + col].get(row1 * 8 + col1)
+        if between is None:
+            return False
 
-        else:
-            step = 1 if (col1 >= col) else -1
-            for c in range(col + step, col1, step):
-                # Если на пути по вертикали есть фигура
-                if not (board.get_piece(row, c) is None):
-                    return False
+        # На пути не должно быть фигур
+        for r, c in between:
+            if board.get_piece(r, c) is not None:
+                return False
 
         return True
 
@@ -321,6 +402,9 @@ class Queen(Piece):
 
         return self.can_move(board, row, col, row1, col1)
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        return self.slide_targets(board, row, col, QUEEN_DIRECTIONS)
+
 
 class King(Piece):
     """Король"""
@@ -336,10 +420,7 @@ class King(Piece):
         if not super().can_move(board, row, col, row1, col1):
             return False
 
-        if not (abs(row - row1) < 2 and abs(col - col1) < 2):
-            return False
-
-        return True
+        return (row1, col1) in KING_TARGET_SETS[row * 8 + col]
 
     def can_attack(self, board, row, col, row1, col1) -> bool:
         if not super().can_attack(board, row, col, row1, col1):
@@ -347,6 +428,10 @@ class King(Piece):
 
         return self.can_move(board, row, col, row1, col1)
 
+    def get_targets(self, board, row, col) -> list[tuple[int, int]]:
+        """Рокировка в список не входит, ее возможность проверяет класс Board"""
+        return self.jump_targets(board, row, col, KING_TARGETS)
+
     def add_check(self) -> None:
         """Сделать короля под шахом"""
         self.check = True
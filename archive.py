@@ -0,0 +1,200 @@
+"""Двоичный архив партий
+Партия хранится как короткий заголовок и ходы, записанные 16-битными числами (notation.encode_move),
+поэтому ход занимает два байта вместо десятков в PGN. В конце файла лежит таблица смещений партий,
+так что любую партию можно прочитать, не разбирая предыдущие.
+Архив читается через mmap: партии достаются по одной, и в память попадают только нужные страницы файла
+
+Устройство файла (все числа big-endian):
+    заголовок файла: b'CHGA', версия (2 байта), резерв (2 байта), число партий (8 байт), смещение таблицы (8 байт)
+    партии: результат (1 байт), резерв (1 байт), число полуходов (4 байта), длина FEN (2 байта),
+            FEN начальной позиции (если партия начинается не с начальной позиции), ходы по 2 байта
+    таблица: смещение каждой партии от начала файла (8 байт)
+
+Запуск:
+    python archive.py convert games.cga games.pgn moves.txt   -- собрать архив из PGN и списков ходов
+    python archive.py replay games.cga                        -- сыграть все партии архива на доске
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from Board import Board, START_FEN
+from batch import open_games
+from notation import encode_move, decode_move, parse_san, parse_uci
+from pgn import RESULTS, replay_game
+
+MAGIC = b'CHGA'
+VERSION = 1
+FILE_HEADER = struct.Struct('>4sHHQQ')
+GAME_HEADER = struct.Struct('>BBIH')
+OFFSET = struct.Struct('>Q')
+
+
+class ArchivedGame:
+    """Партия из архива: номер, результат, начальная позиция в FEN (или None) и коды ходов"""
+    def __init__(self, number, result, fen, codes):
+        self.number: int = number
+        self.result: str = result
+        self.fen: str | None = fen
+        self.codes: tuple[int, ...] = codes
+
+    def moves(self) -> list[tuple]:
+        """Ходы партии в виде ((row, col), (row1, col1), promotion)"""
+        return [decode_move(code) for code in self.codes]
+
+
+class GameArchive:
+    """Архив партий, открытый только для чтения"""
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.index_offset = FILE_HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f'Файл не является архивом партий: {path}')
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Закрыть файл архива"""
+        self.data.close()
+        self.file.close()
+
+    def __getitem__(self, number) -> ArchivedGame:
+        """Прочитать партию с номером number (с нуля)"""
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        offset = OFFSET.unpack_from(self.data, self.index_offset + number * OFFSET.size)[0]
+        result, _, plies, fen_length = GAME_HEADER.unpack_from(self.data, offset)
+        offset += GAME_HEADER.size
+        fen = self.data[offset:offset + fen_length].decode() if fen_length else None
+        offset += fen_length
+        codes = struct.unpack_from(f'>{plies}H', self.data, offset)
+        return ArchivedGame(number, RESULTS[result], fen, codes)
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self[number]
+
+    def replay(self, backend='field'):
+        """Генератор пар (партия, доска после ее последнего хода)
+        Партии из начальной позиции разыгрываются на одной и той же доске, поэтому доска действительна
+        только до следующего шага генератора. Ходы проверены при записи архива и делаются через push"""
+        start_board = Board.create(backend)
+        start_board.draw_rules = False
+        for game in self:
+            if game.fen is None:
+                board = start_board
+                board.reset()
+            else:
+                board = Board.create(backend, game.fen)
+                board.draw_rules = False
+            for move in game.moves():
+                board.push(move)
+            board.update_game_over()
+            yield game, board
+
+
+class ArchiveWriter:
+    """Запись архива: партии добавляются по одной, таблица смещений пишется при закрытии"""
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.offsets: list[int] = []
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, moves, result='*', fen=None) -> None:
+        """Добавить партию: ходы ((row, col), (row1, col1), promotion), результат и начальную позицию"""
+        fen_bytes = fen.encode() if fen is not None and fen != START_FEN else b''
+        self.offsets.append(self.file.tell())
+        self.file.write(GAME_HEADER.pack(RESULTS.index(result), 0, len(moves), len(fen_bytes)))
+        self.file.write(fen_bytes)
+        self.file.write(struct.pack(f'>{len(moves)}H', *map(encode_move, moves)))
+
+    def close(self) -> None:
+        """Записать таблицу смещений и заголовок файла"""
+        if self.file.closed:
+            return None
+        index_offset = self.file.tell()
+        for offset in self.offsets:
+            self.file.write(OFFSET.pack(offset))
+        self.file.seek(0)
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, len(self.offsets), index_offset))
+        self.file.close()
+
+
+def convert(paths, output) -> tuple[int, int]:
+    """Собрать архив из файлов PGN и списков ходов; партии с невозможными ходами или позицией FEN пропускаются
+    Вернуть число записанных и пропущенных партий"""
+    written = skipped = 0
+    start_board = Board.create()
+    with ArchiveWriter(output) as writer:
+        for path in paths:
+            parse = parse_san if path.lower().endswith('.pgn') else parse_uci
+            for game in open_games(path):
+                if game.start_fen() is None:
+                    board = start_board
+                    board.reset()
+                else:
+                    try:
+                        board = Board.create(fen=game.start_fen())
+                    except ValueError:
+                        skipped += 1
+                        continue
+
+                board, illegal_ply = replay_game(game, board, parse)
+                if illegal_ply is not None:
+                    skipped += 1
+                    continue
+                writer.add([record[0] for record in board.move_stack], game.result, game.start_fen())
+                written += 1
+    return written, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Двоичный архив партий')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = commands.add_parser('convert', help='собрать архив из PGN и списков ходов')
+    convert_parser.add_argument('archive', help='файл архива')
+    convert_parser.add_argument('paths', nargs='+', help='файлы PGN (*.pgn) или списки ходов')
+
+    replay_parser = commands.add_parser('replay', help='сыграть все партии архива')
+    replay_parser.add_argument('archive', help='файл архива')
+    replay_parser.add_argument('--backend', default='field', choices=('field', 'bitboard'),
+                               help='способ хранения доски')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'convert':
+        written, skipped = convert(args.paths, args.archive)
+        print(f'Партий записано: {written}, пропущено с невозможными ходами или позицией: {skipped}')
+        print(f'Размер архива: {os.path.getsize(args.archive)} байт, {time.perf_counter() - start:.2f} s')
+        return
+
+    games = plies = 0
+    with GameArchive(args.archive) as archive:
+        for game, _ in archive.replay(args.backend):
+            games += 1
+            plies += len(game.codes)
+    elapsed = time.perf_counter() - start
+    print(f'Партий: {games}, полуходов: {plies}')
+    print(f'Время: {elapsed:.2f} s, {games / max(elapsed, 1e-9):.1f} партий/с')
+
+
+if __name__ == '__main__':
+    main()
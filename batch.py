@@ -0,0 +1,137 @@
+"""Проверка больших наборов партий на нескольких ядрах
+Партии читаются потоком и пачками отправляются в пул процессов. Каждый процесс использует одну и ту же доску
+для всех партий из начальной позиции, а результаты возвращаются в том же порядке, в котором партии были прочитаны
+
+Поддерживаются файлы PGN (*.pgn) и компактные списки ходов: одна партия в строке,
+ходы в длинной нотации через пробел и, при желании, результат в конце: "e2e4 e7e5 g1f3 1-0"
+
+Запуск:
+    python batch.py games.pgn moves.txt [--workers 32] [--chunk 64]
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from Board import Board
+from notation import parse_san, parse_uci
+from pgn import Game, RESULTS, read_games, replay_game
+
+# Доска процесса для партий из начальной позиции, создается один раз при запуске процесса
+_board: Board | None = None
+
+
+class GameReport:
+    """Итог проверки одной партии"""
+    def __init__(self, number, result, plies, winner, stalemate, illegal_ply):
+        self.number: int = number  # Номер партии во входном потоке
+        self.result: str = result  # Результат, записанный в партии
+        self.plies: int = plies  # Число сыгранных полуходов
+        self.winner: int | None = winner  # Победитель, если партия закончилась матом
+        self.stalemate: bool = stalemate  # Закончилась ли партия патом
+        self.illegal_ply: int | None = illegal_ply  # Номер первого невозможного полухода, 0 - невозможная позиция FEN
+
+
+def read_move_lists(stream):
+    """Генератор партий из компактного списка ходов, по одной партии в строке"""
+    number = 0
+    for line in stream:
+        moves = line.split()
+        if not moves:
+            continue
+        result = moves.pop() if moves[-1] in RESULTS else '*'
+        number += 1
+        yield Game(number, {}, moves, result)
+
+
+def init_worker() -> None:
+    """Создать доску процесса"""
+    global _board
+    _board = Board()
+
+
+def check_games(games: list[Game], parse) -> list[GameReport]:
+    """Проверить пачку партий в процессе пула"""
+    reports = []
+    for game in games:
+        if game.start_fen() is None:
+            board = _board
+            board.reset()
+        else:
+            try:
+                board = Board.from_fen(game.start_fen())
+            except ValueError:
+                # Одна партия с неправильным тегом FEN не должна останавливать проверку остальных
+                reports.append(GameReport(game.number, game.result, 0, None, False, 0))
+                continue
+
+        board, illegal_ply = replay_game(game, board, parse)
+        reports.append(GameReport(game.number, game.result, len(board.move_stack),
+                                  board.get_winner(), board.end_by_stalemate(), illegal_ply))
+    return reports
+
+
+def chunks(games, size):
+    """Разбить поток партий на списки по size партий"""
+    chunk = []
+    for game in games:
+        chunk.append(game)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_games(games, parse=parse_san, workers=None, chunk_size=64):
+    """Генератор отчетов GameReport о партиях из потока games в порядке их следования
+    В работе одновременно находится не больше нескольких пачек на процесс, поэтому поток не читается целиком"""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = deque()
+        for chunk in chunks(games, chunk_size):
+            pending.append(executor.submit(check_games, chunk, parse))
+            if len(pending) >= workers * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def open_games(path):
+    """Генератор партий из файла PGN или списка ходов"""
+    with open(path, encoding='utf-8', errors='replace') as stream:
+        if path.lower().endswith('.pgn'):
+            yield from read_games(stream)
+        else:
+            yield from read_move_lists(stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка партий на нескольких ядрах')
+    parser.add_argument('paths', nargs='+', help='файлы PGN (*.pgn) или списки ходов')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию все ядра)')
+    parser.add_argument('--chunk', type=int, default=64, help='число партий в одной пачке')
+    args = parser.parse_args()
+
+    games = plies = errors = 0
+    start = time.perf_counter()
+    for path in args.paths:
+        parse = parse_san if path.lower().endswith('.pgn') else parse_uci
+        for report in validate_games(open_games(path), parse, args.workers, args.chunk):
+            games += 1
+            plies += report.plies
+            if report.illegal_ply is not None:
+                errors += 1
+                if report.illegal_ply == 0:
+                    print(f'{path}: партия {report.number}: невозможная начальная позиция FEN')
+                else:
+                    print(f'{path}: партия {report.number}, полуход {report.illegal_ply}: невозможный ход')
+
+    elapsed = time.perf_counter() - start
+    print(f'Партий: {games}, полуходов: {plies}, с ошибками: {errors}')
+    print(f'Время: {elapsed:.2f} s, {games / max(elapsed, 1e-9):.1f} партий/с')
+
+
+if __name__ == '__main__':
+    main()
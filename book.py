@@ -0,0 +1,172 @@
+"""Дебютная книга
+Книга хранится в двоичном файле из записей одинаковой длины (хеш позиции, ход, вес), отсортированных по хешу.
+Файл не загружается в память целиком: он отображается через mmap, а записи позиции ищутся двоичным поиском,
+поэтому поиск хода читает лишь несколько страниц файла.
+Хеш позиции - 64-битный хеш Zobrist доски (Board.get_hash), ход записан 16-битным числом (notation.encode_move),
+вес - сколько раз ход встретился в партиях, по которым построена книга
+
+Запуск:
+    python book.py build book.bin games.pgn [other.pgn ...] [--plies 20] [--min-count 2]
+    python book.py probe book.bin [--fen "<FEN>"] [--moves e2e4 e7e5]
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+
+from Board import Board, START_FEN
+from notation import encode_move, decode_move, parse_san, parse_uci, move_to_uci
+from pgn import read_games
+
+# Хеш позиции, ход, вес; порядок байтов big-endian, чтобы записи сортировались так же, как числа
+ENTRY = struct.Struct('>QHH')
+MAX_WEIGHT = 0xFFFF
+# Книга, которую компьютер открывает по умолчанию, лежит рядом с программой
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+
+
+class OpeningBook:
+    """Дебютная книга, открытая только для чтения"""
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY.size:
+            self.file.close()
+            raise ValueError(f'Поврежденный файл книги: {path}')
+        self.size = size // ENTRY.size
+        # Пустой файл нельзя отобразить в память
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Закрыть файл книги"""
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def key_at(self, index) -> int:
+        """Хеш позиции записи с номером index"""
+        return ENTRY.unpack_from(self.data, index * ENTRY.size)[0]
+
+    def find(self, key) -> list[tuple[int, int]]:
+        """Все записи позиции с хешем key: список (код хода, вес)"""
+        # Двоичный поиск первой записи с хешем не меньше key
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        while low < self.size:
+            entry_key, code, weight = ENTRY.unpack_from(self.data, low * ENTRY.size)
+            if entry_key != key:
+                break
+            entries.append((code, weight))
+            low += 1
+        return entries
+
+    def get_moves(self, board: Board) -> list[tuple[tuple, int]]:
+        """Ходы из книги для позиции доски: список (ход, вес)
+        Ходы сверяются с допустимыми, чтобы совпадение хешей разных позиций не дало невозможный ход"""
+        moves = []
+        for code, weight in self.find(board.get_hash()):
+            move = decode_move(code)
+            if move in board.legal_moves_from(*move[0]):
+                moves.append((move, weight))
+        return moves
+
+    def choose_move(self, board: Board, rng=random):
+        """Выбрать ход из книги случайно, пропорционально весам, или вернуть None, если позиции нет в книге"""
+        moves = self.get_moves(board)
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+def open_book(path=DEFAULT_BOOK_PATH) -> OpeningBook | None:
+    """Открыть книгу, если файл есть, иначе вернуть None: компьютер может играть и без книги"""
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def build_book(paths, output, max_plies=20, min_count=1) -> int:
+    """Построить книгу по первым max_plies полуходам партий из файлов PGN и вернуть число записей
+    Партии читаются по одной и разыгрываются на одной доске через push и pop"""
+    counts: dict[tuple[int, int], int] = {}
+    board = Board.create()
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            for game in read_games(stream):
+                if game.start_fen() is not None and game.start_fen() != START_FEN:
+                    continue  # Партии не из начальной позиции к дебютам не относятся
+
+                for text in game.moves[:max_plies]:
+                    move = parse_san(board, text)
+                    if move is None:
+                        break
+                    key = (board.get_hash(), encode_move(move))
+                    counts[key] = counts.get(key, 0) + 1
+                    board.push(move)
+                board.reset()
+
+    entries = sorted((key, code, min(count, MAX_WEIGHT)) for (key, code), count in counts.items()
+                     if count >= min_count)
+    with open(output, 'wb') as file:
+        for entry in entries:
+            file.write(ENTRY.pack(*entry))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Дебютная книга')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='построить книгу по партиям PGN')
+    build.add_argument('book', help='файл книги')
+    build.add_argument('paths', nargs='+', help='файлы PGN')
+    build.add_argument('--plies', type=int, default=20, help='сколько первых полуходов партии брать')
+    build.add_argument('--min-count', type=int, default=1, help='наименьшее число партий с ходом')
+
+    probe = commands.add_parser('probe', help='показать ходы из книги для позиции')
+    probe.add_argument('book', help='файл книги')
+    probe.add_argument('--fen', default=START_FEN, help='позиция в нотации FEN')
+    probe.add_argument('--moves', nargs='*', default=[], help='ходы в длинной нотации')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        count = build_book(args.paths, args.book, args.plies, args.min_count)
+        print(f'Записей в книге: {count}')
+        return
+
+    board = Board.create(fen=args.fen)
+    for text in args.moves:
+        move = parse_uci(board, text)
+        if move is None:
+            print(f'Невозможный ход: {text}')
+            return
+        board.push(move)
+
+    with OpeningBook(args.book) as book:
+        moves = sorted(book.get_moves(board), key=lambda item: item[1], reverse=True)
+    if not moves:
+        print('Позиции нет в книге')
+    for move, weight in moves:
+        print(f'{move_to_uci(move)} {weight}')
+
+
+if __name__ == '__main__':
+    main()
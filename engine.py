@@ -0,0 +1,232 @@
+"""Компьютерный противник
+Перебор с альфа-бета отсечением и итеративным углублением: глубина увеличивается, пока не закончится время на ход.
+Ходы пробуются на самой доске через push и pop. Первым перебирается ход из главного варианта прошлой итерации,
+затем взятия по правилу MVV-LVA (самая ценная жертва самой дешевой фигурой), затем остальные ходы.
+На концах перебора досчитываются взятия, чтобы не оценивать позицию посреди размена,
+а затем позиция оценивается по суммам, которые доска поддерживает сама (см. evaluation.py).
+Если передана дебютная книга и позиция в ней есть, ход берется из книги без перебора (см. book.py),
+а в окончаниях с эндшпильными таблицами - точный ход из таблиц (см. tablebase.py)
+
+Запуск:
+    python engine.py [--fen "<FEN>"] [--time 1.0] [--depth 64] [--book book.bin] [--tablebases tablebases]
+"""
+import argparse
+import time
+
+from Board import Board, START_FEN
+from book import OpeningBook, open_book, DEFAULT_BOOK_PATH
+from Pieces import Pawn
+from evaluation import evaluate
+from notation import move_to_uci
+from tablebase import Tablebases, open_tablebases, DEFAULT_TABLEBASE_DIR
+
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+MATE_SCORE = 100000
+INFINITY = MATE_SCORE + 1
+# Оценки по модулю не меньше этой означают мат: до него не больше 1000 полуходов
+MATE_THRESHOLD = MATE_SCORE - 1000
+# Как часто (в позициях) проверять, не закончилось ли время
+TIME_CHECK_NODES = 1024
+
+
+class SearchTimeout(Exception):
+    """Время на ход закончилось или перебор остановлен извне, перебор прерывается"""
+
+
+class SearchResult:
+    """Итог перебора: лучший ход, главный вариант, оценка и статистика"""
+    def __init__(self, best_move, pv, score, depth, nodes, elapsed, source='search'):
+        self.best_move = best_move  # Лучший ход или None, если ходов нет
+        self.pv: list = pv  # Главный вариант, начинается с лучшего хода
+        self.score: int = score  # Оценка для игрока, который ходит, в сотых долях пешки
+        self.depth: int = depth  # Глубина последней завершенной итерации
+        self.nodes: int = nodes  # Число просмотренных позиций
+        self.elapsed: float = elapsed  # Время перебора в секундах
+        self.nps: float = nodes / max(elapsed, 1e-9)  # Позиций в секунду
+        self.source: str = source  # Откуда взят ход: 'search', 'book' или 'tablebase'
+
+
+def mvv_lva(board: Board, move) -> int:
+    """Ключ сортировки ходов: взятия ценной фигуры дешевой и превращения раньше остальных ходов"""
+    (row, col), (row1, col1), char = move
+    attacker = board.get_piece(row, col)
+    victim = board.get_piece(row1, col1)
+    if victim is None and isinstance(attacker, Pawn) and col != col1:
+        victim = board.get_piece(row, col1)  # Взятие на проходе
+
+    score = 0
+    if victim is not None:
+        score += 10 * PIECE_VALUES[victim.char()] - PIECE_VALUES[attacker.char()] + 1
+    if char is not None:
+        score += PIECE_VALUES[char]
+    return score
+
+
+class Searcher:
+    """Перебор позиций доски board с ограничением по времени и глубине
+    stop_event - необязательное событие (threading.Event или multiprocessing.Event), по которому перебор
+    останавливается досрочно и возвращает результат последней законченной итерации"""
+    def __init__(self, board: Board, time_limit=1.0, max_depth=64, stop_event=None):
+        self.board = board
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.stop_event = stop_event
+        self.deadline = 0.0
+        self.nodes = 0
+        self.previous_pv = []
+
+    def search(self) -> SearchResult:
+        """Итеративное углубление: каждая следующая итерация использует главный вариант предыдущей"""
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit
+        self.nodes = 0
+        result = SearchResult(None, [], 0, 0, 0, 0.0)
+
+        moves = list(self.board.legal_moves())
+        if not moves:
+            return result
+        result.best_move, result.pv = moves[0], moves[:1]
+
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, pv = self.negamax(depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+
+            elapsed = time.perf_counter() - start
+            result = SearchResult(pv[0], pv, score, depth, self.nodes, elapsed)
+            self.previous_pv = pv
+
+            if abs(score) >= MATE_SCORE - self.max_depth:
+                break  # Найден мат, дальше искать незачем
+            if elapsed > self.time_limit / 2:
+                break  # Следующая итерация почти наверняка не успеет закончиться
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        result.nps = result.nodes / max(result.elapsed, 1e-9)
+        return result
+
+    def count_node(self) -> None:
+        """Учесть позицию и прервать перебор, если время вышло или пришла команда остановиться"""
+        self.nodes += 1
+        if self.nodes % TIME_CHECK_NODES == 0:
+            if time.perf_counter() > self.deadline or (self.stop_event is not None and self.stop_event.is_set()):
+                raise SearchTimeout
+
+    def order_moves(self, moves, ply) -> list:
+        """Сначала ход из главного варианта прошлой итерации, затем взятия по MVV-LVA"""
+        pv_move = self.previous_pv[ply] if ply < len(self.previous_pv) else None
+        board = self.board
+        return sorted(moves, key=lambda move: INFINITY if move == pv_move else mvv_lva(board, move), reverse=True)
+
+    def negamax(self, depth, alpha, beta, ply) -> tuple[int, list]:
+        """Оценка позиции для игрока, который ходит, и главный вариант"""
+        self.count_node()
+        board = self.board
+        if ply and (board.is_repetition(2) or board.is_fifty_moves()):
+            return 0, []  # Повторение позиции внутри перебора считается ничьей
+        if depth == 0:
+            return self.quiescence(alpha, beta), []
+
+        moves = list(board.legal_moves())
+        if not moves:
+            # Мат оценивается тем выше, чем быстрее он ставится, пат - ничья
+            return (-MATE_SCORE + ply if board.check_on_board() else 0), []
+
+        best_pv = []
+        for move in self.order_moves(moves, ply):
+            board.push(move)
+            try:
+                score, pv = self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                board.pop()
+            score = -score
+
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + pv
+                if alpha >= beta:
+                    break
+        return alpha, best_pv
+
+    def quiescence(self, alpha, beta) -> int:
+        """Досчет взятий: игрок может остановиться, если текущая оценка его устраивает"""
+        self.count_node()
+        stand_pat = evaluate(self.board)
+        if stand_pat >= beta:
+            return beta
+        alpha = max(alpha, stand_pat)
+
+        board = self.board
+        moves = sorted(board.legal_moves(captures_only=True), key=lambda move: mvv_lva(board, move), reverse=True)
+        for move in moves:
+            board.push(move)
+            try:
+                score = -self.quiescence(-beta, -alpha)
+            finally:
+                board.pop()
+
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+
+def search(board: Board, time_limit=1.0, max_depth=64, stop_event=None, book: OpeningBook | None = None,
+           tablebases: Tablebases | None = None) -> SearchResult:
+    """Найти лучший ход на доске board, потратив не больше time_limit секунд
+    Если позиция есть в книге book или в таблицах tablebases, ход возвращается сразу, с нулевой глубиной"""
+    if book is not None:
+        move = book.choose_move(board)
+        if move is not None:
+            return SearchResult(move, [move], 0, 0, 0, 0.0, 'book')
+    if tablebases is not None:
+        found = tablebases.best_move(board)
+        if found is not None:
+            move, result, plies = found
+            score = result * (MATE_SCORE - plies) if result else 0
+            return SearchResult(move, [move], score, 0, 0, 0.0, 'tablebase')
+    return Searcher(board, time_limit, max_depth, stop_event).search()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Поиск лучшего хода')
+    parser.add_argument('--fen', default=START_FEN, help='позиция в нотации FEN')
+    parser.add_argument('--time', type=float, default=1.0, help='время на ход в секундах')
+    parser.add_argument('--depth', type=int, default=64, help='максимальная глубина')
+    parser.add_argument('--backend', default='field', choices=('field', 'bitboard'), help='способ хранения доски')
+    parser.add_argument('--book', default=DEFAULT_BOOK_PATH, help='файл дебютной книги')
+    parser.add_argument('--tablebases', default=DEFAULT_TABLEBASE_DIR, help='папка с эндшпильными таблицами')
+    args = parser.parse_args()
+
+    try:
+        board = Board.create(args.backend, args.fen)
+    except ValueError as error:
+        parser.error(str(error))
+    book = open_book(args.book)
+    tablebases = open_tablebases(args.tablebases)
+    result = search(board, args.time, args.depth, book=book, tablebases=tablebases)
+    if book is not None:
+        book.close()
+    if tablebases is not None:
+        tablebases.close()
+    if result.best_move is None:
+        print('Ходов нет')
+        return
+    if result.source == 'book':
+        print(f'Ход из книги: {move_to_uci(result.best_move)}')
+        return
+    if result.source == 'tablebase':
+        print(f'Ход из таблиц: {move_to_uci(result.best_move)}, оценка: {result.score}')
+        return
+
+    print(f'Лучший ход: {move_to_uci(result.best_move)}')
+    print(f'Вариант: {" ".join(move_to_uci(move) for move in result.pv)}')
+    print(f'Оценка: {result.score}, глубина: {result.depth}')
+    print(f'Позиций: {result.nodes}, {result.elapsed:.2f} s, {result.nps:.0f} nps')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Оценка позиции: материал, таблицы клеток для фигур и плавный переход от миттельшпиля к эндшпилю
+Доска хранит суммы оценок всех фигур для миттельшпиля и эндшпиля и стадию игры и обновляет их
+при каждой перестановке фигуры (см. Board.set_piece), поэтому оценка не перебирает клетки доски.
+Таблицы записаны для белых так, как доска выглядит с их стороны: первая строка таблицы - восьмая горизонталь
+"""
+from colors import WHITE, BLACK
+
+# Стоимость фигур в миттельшпиле и эндшпиле
+MIDDLEGAME_VALUES = {'P': 82, 'N': 337, 'B': 365, 'R': 477, 'Q': 1025, 'K': 0}
+ENDGAME_VALUES = {'P': 94, 'N': 281, 'B': 297, 'R': 512, 'Q': 936, 'K': 0}
+
+# Вклад фигур в стадию игры: в начальной позиции стадия равна MAX_PHASE, без фигур - нулю
+PHASE_WEIGHTS = {'P': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24
+
+PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+PAWN_ENDGAME_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+KING_ENDGAME_TABLE = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+# Таблицы для миттельшпиля и эндшпиля
+TABLES = {'P': (PAWN_TABLE, PAWN_ENDGAME_TABLE),
+          'N': (KNIGHT_TABLE, KNIGHT_TABLE),
+          'B': (BISHOP_TABLE, BISHOP_TABLE),
+          'R': (ROOK_TABLE, ROOK_TABLE),
+          'Q': (QUEEN_TABLE, QUEEN_TABLE),
+          'K': (KING_TABLE, KING_ENDGAME_TABLE)}
+
+
+def square_scores(color, char) -> list[tuple[int, int]]:
+    """Для каждой клетки row * 8 + col оценка (миттельшпиль, эндшпиль) фигуры с точки зрения белых"""
+    middlegame_table, endgame_table = TABLES[char]
+    scores = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        # Для белых первая строка таблицы - горизонталь 7, для черных таблица отражается
+        index = (7 - row) * 8 + col if color == WHITE else square
+        middlegame = MIDDLEGAME_VALUES[char] + middlegame_table[index]
+        endgame = ENDGAME_VALUES[char] + endgame_table[index]
+        scores.append((middlegame, endgame) if color == WHITE else (-middlegame, -endgame))
+    return scores
+
+
+# Оценка каждой фигуры (цвет, символ) на каждой клетке
+PIECE_SQUARE_SCORES = {(color, char): square_scores(color, char) for color in (WHITE, BLACK) for char in TABLES}
+
+
+def evaluate(board) -> int:
+    """Оценка позиции для игрока, который сейчас ходит, в сотых долях пешки
+    Оценки миттельшпиля и эндшпиля смешиваются пропорционально стадии игры"""
+    phase = min(board.phase, MAX_PHASE)
+    score = (board.middlegame_score * phase + board.endgame_score * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if board.current_player_color() == WHITE else -score
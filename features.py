@@ -0,0 +1,203 @@
+"""Позиции в виде массивов NumPy для обучения оценочных моделей
+Позиция кодируется 18 плоскостями 8x8 из нулей и единиц (uint8), плоскость индексируется [row][col], как field:
+    0-5   - белые пешки, кони, слоны, ладьи, ферзи и король
+    6-11  - те же фигуры черных
+    12    - единицы, если ходят белые
+    13-16 - единицы, если есть право рокировки: белые в короткую и в длинную, черные в короткую и в длинную
+    17    - клетка, на которую можно взять на проходе (как в записи FEN)
+
+Клетки не перебираются по одной: по доске собирается короткая запись из 64-битных масок фигур (у BitBoard
+они уже есть), а плоскости целой пачки позиций получаются из масок одной распаковкой битов в NumPy.
+Для выгрузки партий записи копятся в заранее выделенном массиве, и каждые chunk позиций плоскости
+записываются прямо в файл .npy, отображенный в память. Рядом лежит файл с результатами партий
+
+Нужен пакет numpy (pip install -r requirements-optional.txt), остальная программа работает и без него
+
+Запуск:
+    python features.py planes/ games.pgn moves.txt games.cga [--chunk 1000000] [--plies 200]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Модуль загружается и без numpy, но выгрузка невозможна (см. require_numpy)
+
+from BitBoard import BitBoard, CHARS
+from Board import Board
+from colors import WHITE, BLACK
+from positions import read_games
+
+PLANES = 18
+SIDE_PLANE = 12
+EN_PASSANT_PLANE = 17
+# Порядок плоскостей фигур: (цвет, обозначение фигуры)
+PIECE_ORDER = [(color, char) for color in (WHITE, BLACK) for char in CHARS]
+PIECE_INDEX = {key: index for index, key in enumerate(PIECE_ORDER)}
+# Права рокировки (цвет, столбец ладьи) в порядке плоскостей 13-16
+CASTLING_ORDER = ((WHITE, 7), (WHITE, 0), (BLACK, 7), (BLACK, 0))
+# Запись позиции: 12 масок фигур, маска клетки взятия на проходе и флаги (бит 0 - ход белых, биты 1-4 - рокировки)
+RECORD_SIZE = 14
+# Сколько позиций распаковывается за раз: на позицию нужен временный массив в 832 байта
+BATCH = 65536
+# Результат партии с точки зрения белых; незаконченные партии ('*') не выгружаются
+RESULT_VALUES = {'1-0': 1, '1/2-1/2': 0, '0-1': -1}
+NUMPY_MISSING = 'Для выгрузки позиций нужен пакет numpy: pip install -r requirements-optional.txt'
+
+
+def require_numpy() -> None:
+    """Проверить, что numpy установлен, иначе ImportError с понятным сообщением"""
+    if np is None:
+        raise ImportError(NUMPY_MISSING)
+
+
+def piece_masks(board: Board) -> list[int]:
+    """Маски фигур доски в порядке PIECE_ORDER, бит row * 8 + col - клетка (row, col)
+    У BitBoard маски берутся готовыми, у обычной доски клетки перебираются один раз"""
+    if isinstance(board, BitBoard):
+        return [board.bitboards[key] for key in PIECE_ORDER]
+
+    masks = [0] * len(PIECE_ORDER)
+    for row, line in enumerate(board.field):
+        for col, piece in enumerate(line):
+            if piece is not None:
+                masks[PIECE_INDEX[(piece.color, piece.char())]] |= 1 << (row * 8 + col)
+    return masks
+
+
+def position_record(board: Board) -> tuple[int, ...]:
+    """Запись позиции из RECORD_SIZE чисел, по которой fill_planes строит плоскости"""
+    flags = 1 if board.current_player_color() == WHITE else 0
+    rights = board.castling_rights()
+    for bit, right in enumerate(CASTLING_ORDER, 1):
+        if right in rights:
+            flags |= 1 << bit
+
+    en_passant = 0
+    if board.en_passant_square is not None:
+        # Клетка за пешкой, которая только что пошла на две клетки
+        row, col = board.en_passant_square
+        en_passant = 1 << ((row - 1 if row == 3 else row + 1) * 8 + col)
+
+    return *piece_masks(board), en_passant, flags
+
+
+def fill_planes(records, out) -> None:
+    """Заполнить out (массив uint8 формы (len(records), PLANES, 8, 8)) плоскостями позиций по их записям"""
+    require_numpy()
+    records = np.asarray(records, dtype=np.uint64).reshape(-1, RECORD_SIZE)
+    for start in range(0, len(records), BATCH):
+        part = records[start:start + BATCH]
+        target = out[start:start + len(part)]
+
+        # Маски раскладываются на байты от младшего к старшему, а байты - на биты от младшего,
+        # так что бит номер row * 8 + col оказывается в клетке [row][col]
+        masks = np.ascontiguousarray(part[:, :RECORD_SIZE - 1], dtype='<u8')
+        bits = np.unpackbits(masks.view(np.uint8), axis=1, bitorder='little').reshape(len(part), -1, 8, 8)
+        target[:, :SIDE_PLANE] = bits[:, :SIDE_PLANE]
+        target[:, EN_PASSANT_PLANE] = bits[:, SIDE_PLANE]
+
+        flags = (part[:, RECORD_SIZE - 1, None] >> np.arange(5, dtype=np.uint64)) & 1
+        target[:, SIDE_PLANE:EN_PASSANT_PLANE] = flags[:, :, None, None]
+
+
+def encode_positions(boards, out=None) -> 'np.ndarray':
+    """Плоскости позиций досок boards; если передан out, он заполняется и возвращается"""
+    records = [position_record(board) for board in boards]
+    if out is None:
+        out = np.empty((len(records), PLANES, 8, 8), dtype=np.uint8)
+    fill_planes(records, out)
+    return out
+
+
+def position_records(board: Board, moves, parse=None):
+    """Генератор записей позиций партии: перед каждым ходом и после последнего (см. positions.game_keys)"""
+    for move in moves:
+        if parse is not None:
+            move = parse(board, move)
+            if move is None:
+                break
+        yield position_record(board)
+        board.push(move)
+    yield position_record(board)
+
+
+def chunk_paths(directory, number) -> tuple[str, str]:
+    """Файлы плоскостей и результатов части с номером number"""
+    return (os.path.join(directory, f'planes_{number:05d}.npy'),
+            os.path.join(directory, f'results_{number:05d}.npy'))
+
+
+def write_chunk(directory, number, records, results) -> None:
+    """Записать часть выгрузки: плоскости строятся прямо в файле, отображенном в память"""
+    planes_path, results_path = chunk_paths(directory, number)
+    planes = np.lib.format.open_memmap(planes_path, mode='w+', dtype=np.uint8,
+                                       shape=(len(records), PLANES, 8, 8))
+    fill_planes(records, planes)
+    planes.flush()
+    del planes
+    np.save(results_path, results)
+
+
+def export(paths, directory, chunk_size=1000000, max_plies=None, backend='bitboard') -> int:
+    """Выгрузить позиции законченных партий из файлов PGN, списков ходов и архивов *.cga
+    в части по chunk_size позиций и вернуть число позиций"""
+    require_numpy()
+    os.makedirs(directory, exist_ok=True)
+    records = np.empty((chunk_size, RECORD_SIZE), dtype=np.uint64)
+    results = np.empty(chunk_size, dtype=np.int8)
+    count = total = chunks = 0
+    for result, game in read_games(paths, position_records, backend):
+        value = RESULT_VALUES.get(result)
+        if value is None or game is None:
+            continue  # Незаконченная партия или невозможная позиция FEN
+
+        for ply, record in enumerate(game):
+            if max_plies is not None and ply > max_plies:
+                break
+            records[count] = record
+            results[count] = value
+            count += 1
+            if count == chunk_size:
+                write_chunk(directory, chunks, records, results)
+                total += count
+                chunks += 1
+                count = 0
+
+    if count:
+        write_chunk(directory, chunks, records[:count], results[:count])
+        total += count
+    return total
+
+
+def load_chunks(directory):
+    """Генератор пар (плоскости, результаты) выгрузки; плоскости отображаются в память, а не читаются"""
+    require_numpy()
+    for planes_path in sorted(glob.glob(os.path.join(directory, 'planes_*.npy'))):
+        number = int(os.path.basename(planes_path)[len('planes_'):-len('.npy')])
+        yield np.load(planes_path, mmap_mode='r'), np.load(chunk_paths(directory, number)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Выгрузка позиций в массивы NumPy')
+    parser.add_argument('directory', help='папка для файлов .npy')
+    parser.add_argument('paths', nargs='+', help='файлы PGN (*.pgn), архивы (*.cga) или списки ходов')
+    parser.add_argument('--chunk', type=int, default=1000000, help='число позиций в одном файле')
+    parser.add_argument('--plies', type=int, default=None, help='сколько первых полуходов партии выгружать')
+    args = parser.parse_args()
+    if np is None:
+        print(NUMPY_MISSING, file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    count = export(args.paths, args.directory, args.chunk, args.plies)
+    elapsed = time.perf_counter() - start
+    print(f'Позиций: {count}, {elapsed:.2f} s, {count / max(elapsed, 1e-9):.0f} позиций/с')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 """Импортируем модули и создаем словарь с именами файлов, на которые будем ссылаться при создании изображения"""
 import tkinter as tk
 
-from Board import Board
+from Board import Board, REPETITION, FIFTY_MOVES, INSUFFICIENT_MATERIAL
+from notation import move_to_san
 from Pieces import Piece, Pawn
 from colors import WHITE, BLACK
+from worker import EngineWorker
 
 images = {(WHITE, 'P'): 'WhitePawn.png',
           (WHITE, 'R'): 'WhiteRook.png',
@@ -18,12 +20,29 @@ images = {(WHITE, 'P'): 'WhitePawn.png',
           (BLACK, 'Q'): 'BlackQueen.png',
           (BLACK, 'K'): 'BlackKing.png'}
 
+# Изображения фигур читаются с диска один раз и дальше используются всеми TkPiece и окном превращения
+sprites: dict[tuple[int, str], tk.PhotoImage] = {}
+
+
+def get_sprite(color, char) -> tk.PhotoImage:
+    """Изображение фигуры из общего кеша; при первом обращении оно загружается из файла"""
+    key = (color, char)
+    if key not in sprites:
+        sprites[key] = tk.PhotoImage(file=images[key])
+    return sprites[key]
+
+
+def load_sprites():
+    """Загрузить изображения всех фигур при запуске, чтобы во время игры не читать файлы"""
+    for color, char in images:
+        get_sprite(color, char)
+
 
 class TkPiece:
     """При создании объекта создается изображение на холсте по координатам клетки"""
     def __init__(self, canvas: tk.Canvas, piece: Piece, row, col):
         self.piece = piece
-        self.image = tk.PhotoImage(file=images[(self.piece.color, self.piece.char())])
+        self.image = get_sprite(self.piece.color, self.piece.char())
         self.row = row
         self.col = col
         self.canvas = canvas
@@ -34,6 +53,16 @@ class TkPiece:
         x, y = self.col * 75 + 37.5, (7 - self.row) * 75 + 37.5
         return self.canvas.create_image((x, y), image=self.image)
 
+    def move_to(self, row, col):
+        """Переставить изображение в клетку (row, col), не создавая его заново"""
+        self.row = row
+        self.col = col
+        self.canvas.coords(self.piece_id, (col * 75 + 37.5, (7 - row) * 75 + 37.5))
+
+    def delete(self):
+        """Убрать изображение с холста"""
+        self.canvas.delete(self.piece_id)
+
     def get_piece(self):
         """Возвращает фигуру"""
         return self.piece
@@ -41,8 +70,8 @@ class TkPiece:
 
 class TkBoard:
     """В данном классе хранится изображение доски и осуществляется взаимодействие пользователя с механикой игры"""
-    def __init__(self):
-        self.board = Board()
+    def __init__(self, backend='field'):
+        self.board = Board.create(backend)
 
         self.master = tk.Tk()
         self.master.geometry('600x630')
@@ -52,15 +81,36 @@ class TkBoard:
         self.canvas = tk.Canvas(self.master, height=600, width=600)
         self.label = tk.Label(self.master)
 
+        # Цвет, которым играет компьютер, или -1, если играют два человека
+        self.engine_color = tk.IntVar(self.master, value=-1)
+        self.engine_time = 1.0
+        # Показывать лучший ход для игрока, который ходит
+        self.show_hint = tk.BooleanVar(self.master, value=False)
+
+        # Перебор и разбор позиции выполняются в фоновом процессе, интерфейс только опрашивает результаты
+        self.worker: None | EngineWorker = None
+        self.engine_job = None  # Номер задания, которое ищет ход компьютера
+        self.hint_job = None  # Номер задания, которое ищет подсказку
+        self.moves_job = None  # Номер задания, которое находит все допустимые ходы
+        self.legal_moves: None | dict = None  # Допустимые ходы по клеткам, откуда они делаются
+        self.polling = False
+        self.status_text = ''
+
+        menu = tk.Menu(self.master)
+        game_menu = tk.Menu(menu, tearoff=0)
+        game_menu.add_radiobutton(label='Два игрока', variable=self.engine_color, value=-1,
+                                  command=self.start_analysis)
+        game_menu.add_radiobutton(label='Против компьютера (компьютер играет черными)', variable=self.engine_color,
+                                  value=BLACK, command=self.start_analysis)
+        game_menu.add_radiobutton(label='Против компьютера (компьютер играет белыми)', variable=self.engine_color,
+                                  value=WHITE, command=self.start_analysis)
+        game_menu.add_separator()
+        game_menu.add_checkbutton(label='Подсказка', variable=self.show_hint, command=self.start_analysis)
+        menu.add_cascade(label='Игра', menu=game_menu)
+        self.master.config(menu=menu)
+
         self.board_image = tk.PhotoImage(file='Board.png')
-        self.wQ = tk.PhotoImage(file=images[(WHITE, 'Q')])
-        self.wR = tk.PhotoImage(file=images[(WHITE, 'R')])
-        self.wB = tk.PhotoImage(file=images[(WHITE, 'B')])
-        self.wN = tk.PhotoImage(file=images[(WHITE, 'N')])
-        self.bQ = tk.PhotoImage(file=images[(BLACK, 'Q')])
-        self.bR = tk.PhotoImage(file=images[(BLACK, 'R')])
-        self.bB = tk.PhotoImage(file=images[(BLACK, 'B')])
-        self.bN = tk.PhotoImage(file=images[(BLACK, 'N')])
+        load_sprites()
 
         self.canvas.create_image((0, 0), image=self.board_image, anchor='nw')
 
@@ -102,12 +152,33 @@ class TkBoard:
     def grab_piece(self, event: tk.Event):
         """Когда пользователь нажимает ЛКМ, определяются координаты клетки, в которой произошел клик
         Если в клетке есть фигура, она будет двигаться за курсором"""
+        if self.is_engine_turn():
+            return None  # Сейчас ходит компьютер
+
         row, col = 7 - event.y // 75, event.x // 75
         self.grabbed: None | int = self.cords.get((row, col))
         if self.grabbed:
             piece: TkPiece = self.pieces[self.grabbed]
             if piece.get_piece().get_color() != self.board.current_player_color():
                 self.grabbed = None
+            else:
+                self.show_moves(row, col)
+
+    def show_moves(self, row, col):
+        """Подсветить клетки, в которые может пойти фигура из клетки (row, col)"""
+        if self.legal_moves is not None:
+            moves = self.legal_moves.get((row, col), [])
+        else:
+            moves = self.board.legal_moves_from(row, col)  # Фоновый разбор позиции еще не закончен
+        for _, (row1, col1), _ in moves:
+            x, y = col1 * 75 + 37.5, (7 - row1) * 75 + 37.5
+            self.canvas.create_oval((x - 10, y - 10, x + 10, y + 10), fill='#6a8d3a', outline='', tags='move_hint')
+        # Взятая фигура должна оставаться поверх подсказок
+        self.canvas.tag_raise(self.grabbed)
+
+    def hide_moves(self):
+        """Убрать подсветку возможных ходов"""
+        self.canvas.delete('move_hint')
 
     def move_piece(self, event: tk.Event):
         """Если пользователь схватил фигуру мышкой, то она будет передвигаться за курсором"""
@@ -123,6 +194,8 @@ class TkBoard:
         if self.grabbed is None:
             return None
 
+        self.hide_moves()
+
         if event.x not in range(600) or event.y not in range(600):
             self.cancel_move(None)
             return None
@@ -152,24 +225,18 @@ class TkBoard:
             x = col * 75
         y = (7 - row) * 75
 
-        self.promote_image = self.canvas.create_rectangle((x, y, x + 300, y + 75), fill='#79553d')
+        self.promote_image = self.canvas.create_rectangle((x, y, x + 300, y + 75), fill='#79553d', tags='promote')
 
-        if row == 7:
-            self.canvas.create_image((x, y), image=self.wQ, anchor='nw')
-            self.canvas.create_image((x + 75, y), image=self.wR, anchor='nw')
-            self.canvas.create_image((x + 150, y), image=self.wB, anchor='nw')
-            self.canvas.create_image((x + 225, y), image=self.wN, anchor='nw')
-        else:
-            self.canvas.create_image((x, y), image=self.bQ, anchor='nw')
-            self.canvas.create_image((x + 75, y), image=self.bR, anchor='nw')
-            self.canvas.create_image((x + 150, y), image=self.bB, anchor='nw')
-            self.canvas.create_image((x + 225, y), image=self.bN, anchor='nw')
+        color = WHITE if row == 7 else BLACK
+        for i, char in enumerate('QRBN'):
+            self.canvas.create_image((x + i * 75, y), image=get_sprite(color, char), anchor='nw', tags='promote')
 
         self.promote_image_col = x // 75
         self.promote_image_row = 7 - y // 75
 
     def hide_promote_image(self):
         """Спрятать картину с вариантами превращения"""
+        self.canvas.delete('promote')
         self.promote_image = None
         self.update_board()
 
@@ -201,22 +268,41 @@ class TkBoard:
         """Если пользователь нажал ПКМ, то фигура, которую он взял, возвращается на место"""
         if self.grabbed is None:
             return None
+        self.hide_moves()
         old_cords = (self.pieces[self.grabbed].col * 75 + 37.5, (7 - self.pieces[self.grabbed].row) * 75 + 37.5)
         self.canvas.coords(self.grabbed, old_cords)
         self.grabbed = None
 
     def update_board(self):
-        """После хода рисуется доска с новым положением фигур """
-        self.canvas.create_image((0, 0), image=self.board_image, anchor='nw')
-        self.pieces = {}
-        self.cords = {}
-        self.grabbed = None
+        """После хода перерисовываются только изменившиеся клетки: изображения фигур, которые остались на доске,
+        переставляются на их клетки, изображения снятых с доски фигур удаляются, а новых (после превращения)
+        создаются. Поэтому число элементов холста не растет от хода к ходу"""
+        # Изображения ищутся по самим фигурам: при ходе доска переставляет тот же объект фигуры
+        items = {id(tk_piece.get_piece()): item for item, tk_piece in self.pieces.items()}
+        pieces = {}
+        cords = {}
         for row in range(8):
             for col in range(8):
-                if self.board.get_piece(row, col):
-                    piece = TkPiece(self.canvas, self.board.get_piece(row, col), row, col)
-                    self.pieces[piece.piece_id] = piece
-                    self.cords[(row, col)] = piece.piece_id
+                piece = self.board.get_piece(row, col)
+                if piece is None:
+                    continue
+                item = items.pop(id(piece), None)
+                if item is None:
+                    tk_piece = TkPiece(self.canvas, piece, row, col)
+                    item = tk_piece.piece_id
+                else:
+                    tk_piece = self.pieces[item]
+                    # Взятую фигуру пользователь мог утащить с ее клетки, даже если ход не удался
+                    if (tk_piece.row, tk_piece.col) != (row, col) or item == self.grabbed:
+                        tk_piece.move_to(row, col)
+                pieces[item] = tk_piece
+                cords[(row, col)] = item
+
+        for item in items.values():
+            self.pieces[item].delete()  # Фигуры, которые взяли или превратили
+        self.pieces = pieces
+        self.cords = cords
+        self.grabbed = None
 
         text = ''
         if self.board.game_over():
@@ -228,12 +314,80 @@ class TkBoard:
                 text = 'Белые выиграли. Поставлен мат' if winner == WHITE else 'Черные выиграли. Поставлен мат'
             elif self.board.end_by_stalemate():
                 text = 'Ничья. Пат'
+            elif self.board.get_draw_reason() == REPETITION:
+                text = 'Ничья. Троекратное повторение позиции'
+            elif self.board.get_draw_reason() == FIFTY_MOVES:
+                text = 'Ничья. Правило 50 ходов'
+            elif self.board.get_draw_reason() == INSUFFICIENT_MATERIAL:
+                text = 'Ничья. Недостаточно материала для мата'
         else:
             text = 'Ход белых' if self.board.current_player_color() == WHITE else 'Ход черных'
             if self.board.check_on_board():
                 text += '. Шах'
 
+        self.status_text = text
         self.label.config(text=text)
+        self.start_analysis()
+
+    def is_engine_turn(self) -> bool:
+        """Проверка, должен ли сейчас ходить компьютер"""
+        return self.engine_color.get() == self.board.current_player_color() and not self.board.game_over()
+
+    def get_worker(self) -> EngineWorker:
+        """Фоновый процесс запускается при первой необходимости"""
+        if self.worker is None:
+            self.worker = EngineWorker()
+        return self.worker
+
+    def start_analysis(self):
+        """Отменить задания для прошлой позиции и отправить в фоновый процесс задания для текущей"""
+        worker = self.get_worker()
+        worker.cancel()
+        self.engine_job = self.hint_job = None
+        self.legal_moves = None
+        self.label.config(text=self.status_text)
+        if self.board.game_over():
+            self.moves_job = None
+            return None
+
+        self.moves_job = worker.submit('moves', self.board)
+        if self.is_engine_turn():
+            self.engine_job = worker.submit('search', self.board, self.engine_time)
+            self.label.config(text='Компьютер думает...')
+        elif self.show_hint.get():
+            self.hint_job = worker.submit('search', self.board, self.engine_time)
+
+        if not self.polling:
+            self.polling = True
+            self.master.after(50, self.poll_worker)
+
+    def poll_worker(self):
+        """Забрать готовые результаты фонового процесса; опрос продолжается, пока есть незаконченные задания"""
+        for job_id, kind, result in self.worker.poll():
+            if job_id == self.moves_job:
+                self.legal_moves = result
+                self.moves_job = None
+            elif job_id == self.engine_job:
+                self.engine_job = None
+                if result.best_move is not None and self.is_engine_turn():
+                    self.board.make_move(result.best_move)
+                    self.update_board()
+            elif job_id == self.hint_job:
+                self.hint_job = None
+                if result.best_move is not None:
+                    hint = move_to_san(self.board, result.best_move)
+                    self.label.config(text=f'{self.status_text}. Подсказка: {hint}')
+
+        if self.moves_job is None and self.engine_job is None and self.hint_job is None:
+            self.polling = False
+        else:
+            self.master.after(50, self.poll_worker)
+
+    def close(self):
+        """Остановить фоновый процесс и закрыть окно"""
+        if self.worker is not None:
+            self.worker.close()
+        self.master.destroy()
 
     def run(self):
         """Запуск программы"""
@@ -243,6 +397,7 @@ class TkBoard:
         self.master.bind('<B1-Motion>', self.move_piece)
         self.master.bind('<ButtonRelease-1>', self.drop_piece)
         self.master.bind('<Button-3>', self.cancel_move)
+        self.master.protocol('WM_DELETE_WINDOW', self.close)
         self.master.mainloop()
 
 
@@ -0,0 +1,141 @@
+"""Запись клеток и ходов в шахматной нотации
+Клетка (row, col) записывается как буква вертикали и номер горизонтали: (0, 4) - 'e1'
+Ход ((row, col), (row1, col1), promotion) записывается в длинной нотации: 'e2e4', 'e7e8q'
+или в стандартной нотации, как в PGN: 'e4', 'Nf3', 'exd5', 'O-O', 'e8=Q'
+Для хранения в двоичных файлах ход кодируется 16-битным числом:
+биты 0-5 - клетка, откуда идет фигура, биты 6-11 - клетка, куда она идет, биты 12-14 - фигура превращения"""
+from colors import WHITE
+
+FILES = 'abcdefgh'
+# Фигуры превращения по их коду в 16-битной записи хода, 0 - без превращения
+PROMOTION_CODES = (None, 'N', 'B', 'R', 'Q')
+
+
+def square_name(row, col) -> str:
+    """Вернуть название клетки (row, col)"""
+    return FILES[col] + str(row + 1)
+
+
+def parse_square(text) -> tuple[int, int] | None:
+    """Вернуть клетку (row, col) по ее названию или None, если название неправильное"""
+    if len(text) != 2 or text[0] not in FILES or text[1] not in '12345678':
+        return None
+    return int(text[1]) - 1, FILES.index(text[0])
+
+
+def move_to_uci(move) -> str:
+    """Записать ход ((row, col), (row1, col1), promotion) в длинной нотации"""
+    (row, col), (row1, col1), char = move
+    return square_name(row, col) + square_name(row1, col1) + (char.lower() if char else '')
+
+
+def parse_uci(board, text):
+    """Найти среди допустимых ходов доски ход, записанный в длинной нотации, или вернуть None"""
+    start, end = parse_square(text[:2]), parse_square(text[2:4])
+    if start is None or end is None:
+        return None
+    char = text[4:].upper() or None
+
+    for move in board.legal_moves_from(*start):
+        if move[1] == end and move[2] == char:
+            return move
+    return None
+
+
+def encode_move(move) -> int:
+    """Записать ход ((row, col), (row1, col1), promotion) 16-битным числом"""
+    (row, col), (row1, col1), char = move
+    return (row * 8 + col) | (row1 * 8 + col1) << 6 | PROMOTION_CODES.index(char) << 12
+
+
+def decode_move(code):
+    """Восстановить ход ((row, col), (row1, col1), promotion) по 16-битному числу"""
+    start, end = code & 63, code >> 6 & 63
+    return divmod(start, 8), divmod(end, 8), PROMOTION_CODES[code >> 12 & 7]
+
+
+def move_to_san(board, move) -> str:
+    """Записать допустимый ход доски в стандартной нотации: 'Nf3', 'exd5', 'O-O', 'e8=Q+'"""
+    (row, col), (row1, col1), char = move
+    piece = board.get_piece(row, col)
+
+    if piece.char() == 'K' and abs(col1 - col) == 2:
+        san = 'O-O' if col1 == 6 else 'O-O-O'
+    else:
+        capture = board.get_piece(row1, col1) is not None or (piece.char() == 'P' and col != col1)
+        if piece.char() == 'P':
+            san = (FILES[col] + 'x' if capture else '') + square_name(row1, col1)
+            if char is not None:
+                san += '=' + char
+        else:
+            # Уточняем вертикаль или горизонталь, если на эту клетку может пойти другая такая же фигура
+            others = [start for start, end, _ in board.legal_moves()
+                      if end == (row1, col1) and start != (row, col)
+                      and board.get_piece(*start).char() == piece.char()]
+            disambiguation = ''
+            if others:
+                if all(other_col != col for _, other_col in others):
+                    disambiguation = FILES[col]
+                elif all(other_row != row for other_row, _ in others):
+                    disambiguation = str(row + 1)
+                else:
+                    disambiguation = square_name(row, col)
+            san = piece.char() + disambiguation + ('x' if capture else '') + square_name(row1, col1)
+
+    board.push(move)
+    if board.check_on_board():
+        san += '#' if next(board.legal_moves(), None) is None else '+'
+    board.pop()
+    return san
+
+
+def parse_san(board, text):
+    """Найти среди допустимых ходов доски ход, записанный в стандартной нотации, или вернуть None
+    Понимает уточнение вертикали и горизонтали, взятия, рокировки (O-O, 0-0), превращения (e8=Q, e8Q)"""
+    san = text.rstrip('+#!?')
+
+    if san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        row = 0 if board.current_player_color() == WHITE else 7
+        end = (row, 6) if len(san) == 3 else (row, 2)
+        for move in board.legal_moves_from(row, 4):
+            if move[1] == end and board.get_piece(row, 4).char() == 'K':
+                return move
+        return None
+
+    char = None
+    if '=' in san:
+        san, char = san.split('=', 1)
+    elif len(san) > 2 and san[-1] in 'QRBN' and san[0] in FILES:
+        san, char = san[:-1], san[-1]
+
+    end = parse_square(san[-2:])
+    if end is None:
+        return None
+
+    piece_char = san[0] if san[0] in 'NBRQK' else 'P'
+    disambiguation = san[1 if piece_char != 'P' else 0:-2].replace('x', '')
+    start_col = start_row = None
+    for symbol in disambiguation:
+        if symbol in FILES:
+            start_col = FILES.index(symbol)
+        elif symbol in '12345678':
+            start_row = int(symbol) - 1
+        else:
+            return None
+
+    found = None
+    for row in range(8):
+        if start_row is not None and row != start_row:
+            continue
+        for col in range(8):
+            if start_col is not None and col != start_col:
+                continue
+            piece = board.get_piece(row, col)
+            if piece is None or piece.get_color() != board.current_player_color() or piece.char() != piece_char:
+                continue
+            for move in board.legal_moves_from(row, col):
+                if move[1] == end and move[2] == char:
+                    if found is not None:
+                        return None  # Ход записан неоднозначно
+                    found = move
+    return found
@@ -0,0 +1,122 @@
+"""Perft: подсчет числа позиций на глубину depth
+Служит для проверки правил ходов в Pieces.py и Board.py по известным значениям и для замера скорости генерации ходов
+
+Запуск:
+    python perft.py 4                         -- perft из начальной позиции на глубину 4
+    python perft.py 3 --divide                -- число позиций после каждого хода из корня
+    python perft.py 3 --moves e2e4 e7e5       -- perft из позиции после ходов e2e4 e7e5
+    python perft.py 3 --fen "<FEN>"           -- perft из позиции, заданной в FEN
+    python perft.py --check 4                 -- сверка с эталонными значениями до глубины 4
+    python perft.py 4 --backend bitboard      -- то же на доске с битовыми масками
+"""
+import argparse
+import sys
+import time
+
+from Board import Board, START_FEN
+from notation import move_to_uci, parse_uci
+
+# Эталонные позиции: (название, FEN, число позиций на глубинах 1, 2, ...)
+REFERENCE_POSITIONS = [
+    ('startpos', START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(board: Board, depth) -> int:
+    """Число позиций, которые получаются из текущей ровно за depth ходов"""
+    if depth == 0:
+        return 1
+
+    moves = list(board.legal_moves())
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board: Board, depth) -> dict:
+    """Perft, разбитый по ходам из текущей позиции: {ход: число позиций}"""
+    result = {}
+    for move in list(board.legal_moves()):
+        board.push(move)
+        result[move] = perft(board, depth - 1)
+        board.pop()
+    return result
+
+
+def setup_board(fen, moves, backend='field') -> Board:
+    """Создать доску в позиции fen и сделать на ней ходы в длинной нотации"""
+    board = Board.create(backend, fen)
+    board.draw_rules = False  # Perft считает все ходы, даже после повторения позиции
+    for text in moves:
+        move = parse_uci(board, text)
+        if move is None:
+            raise ValueError(f'Невозможный ход: {text}')
+        board.push(move)
+        board.update_game_over()
+    return board
+
+
+def check(max_depth, backend='field') -> bool:
+    """Сверить perft эталонных позиций до глубины max_depth, вернуть, совпали ли все значения"""
+    all_correct = True
+    for name, fen, counts in REFERENCE_POSITIONS:
+        board = setup_board(fen, [], backend)
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            start = time.perf_counter()
+            nodes = perft(board, depth)
+            elapsed = time.perf_counter() - start
+            status = 'OK' if nodes == expected else f'ОШИБКА, ожидалось {expected}'
+            all_correct = all_correct and nodes == expected
+            print(f'{name} depth {depth}: {nodes} nodes, {elapsed:.2f} s, '
+                  f'{nodes / max(elapsed, 1e-9):.0f} nps  {status}')
+    return all_correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Perft: подсчет позиций на заданную глубину')
+    parser.add_argument('depth', type=int, nargs='?', default=3, help='глубина')
+    parser.add_argument('--fen', default=START_FEN, help='позиция в нотации FEN')
+    parser.add_argument('--moves', nargs='*', default=[], help='ходы из позиции в длинной нотации')
+    parser.add_argument('--divide', action='store_true', help='вывести число позиций после каждого хода из корня')
+    parser.add_argument('--check', action='store_true', help='сверить эталонные позиции до глубины depth')
+    parser.add_argument('--backend', default='field', choices=('field', 'bitboard'), help='способ хранения доски')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.depth, args.backend) else 1)
+
+    board = setup_board(args.fen, args.moves, args.backend)
+    start = time.perf_counter()
+    if args.divide:
+        result = divide(board, args.depth)
+        for move in sorted(result, key=move_to_uci):
+            print(f'{move_to_uci(move)}: {result[move]}')
+        nodes = sum(result.values())
+        print(f'Ходов: {len(result)}')
+    else:
+        nodes = perft(board, args.depth)
+    elapsed = time.perf_counter() - start
+
+    print(f'Позиций: {nodes}')
+    print(f'Время: {elapsed:.2f} s, {nodes / max(elapsed, 1e-9):.0f} nps')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Потоковое чтение партий в формате PGN и их проверка по правилам Board
+Файл читается построчно и партии обрабатываются по одной, поэтому память не зависит от размера архива
+
+Запуск:
+    python pgn.py games.pgn [other.pgn ...]   -- проверить все партии и вывести невозможные ходы
+"""
+import re
+import sys
+import time
+
+from Board import Board
+from notation import parse_san
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+HEADER_RE = re.compile(r'\[\s*(\w+)\s+"(.*)"\s*]')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+
+
+class Game:
+    """Партия из PGN: номер в файле, заголовки, ходы в стандартной нотации и результат"""
+    def __init__(self, number, headers, moves, result):
+        self.number: int = number
+        self.headers: dict[str, str] = headers
+        self.moves: list[str] = moves
+        self.result: str = result
+
+    def start_fen(self) -> str | None:
+        """Вернуть начальную позицию партии, если она задана в заголовках"""
+        return self.headers.get('FEN')
+
+
+def split_movetext(text) -> tuple[list[str], str]:
+    """Разбить текст ходов на ходы и результат, пропустив комментарии, варианты, номера ходов и оценки"""
+    moves = []
+    result = '*'
+    depth = 0  # Вложенность вариантов в скобках
+    text = re.sub(r'\{[^}]*}', ' ', text)
+    for token in text.replace('(', ' ( ').replace(')', ' ) ').split():
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(depth - 1, 0)
+        elif depth:
+            continue
+        elif token in RESULTS:
+            result = token
+        elif token.startswith('$'):
+            continue
+        else:
+            token = MOVE_NUMBER_RE.sub('', token)
+            if token:
+                moves.append(token)
+    return moves, result
+
+
+def read_games(stream):
+    """Генератор партий из построчного потока PGN (например, открытого файла)"""
+    number = 0
+    headers = {}
+    movetext = []
+
+    for line in stream:
+        line = line.strip()
+        if line.startswith('%'):
+            continue  # Служебная строка
+        if ';' in line and '{' not in line:
+            line = line[:line.index(';')]  # Комментарий до конца строки
+
+        header = HEADER_RE.fullmatch(line) if line.startswith('[') else None
+        if header is not None:
+            if movetext:
+                number += 1
+                yield Game(number, headers, *split_movetext(' '.join(movetext)))
+                headers, movetext = {}, []
+            headers[header.group(1)] = header.group(2)
+        elif line:
+            movetext.append(line)
+
+    if headers or movetext:
+        number += 1
+        yield Game(number, headers, *split_movetext(' '.join(movetext)))
+
+
+def replay_game(game: Game, board: Board | None = None, parse=parse_san) -> tuple[Board, int | None]:
+    """Сыграть партию через move_piece и move_and_promote_pawn
+    parse - функция, которая находит ход по его записи (по умолчанию стандартная нотация)
+    Возвращает доску после последнего удачного хода и номер первого невозможного полухода (или None).
+    Если доска не передана и тег FEN партии описывает невозможную позицию, возникает ValueError
+    Ничья по повторению и правилу 50 ходов в записанной партии наступает, только если ее потребовал игрок,
+    поэтому эти правила при проверке выключаются"""
+    if board is None:
+        board = Board.create(fen=game.start_fen())
+    board.draw_rules = False
+
+    for ply, text in enumerate(game.moves, start=1):
+        move = parse(board, text)
+        if move is None or not board.make_move(move):
+            return board, ply
+    return board, None
+
+
+def validate(paths) -> int:
+    """Проверить все партии из файлов, вывести невозможные ходы и скорость, вернуть число партий с ошибками"""
+    games = plies = errors = 0
+    start = time.perf_counter()
+
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            for game in read_games(stream):
+                games += 1
+                try:
+                    board, illegal_ply = replay_game(game)
+                except ValueError as error:
+                    errors += 1
+                    print(f'{path}: партия {game.number}: {error}')
+                    continue
+                plies += len(board.move_stack)
+                if illegal_ply is not None:
+                    errors += 1
+                    print(f'{path}: партия {game.number}, полуход {illegal_ply}: '
+                          f'невозможный ход {game.moves[illegal_ply - 1]}')
+
+    elapsed = time.perf_counter() - start
+    print(f'Партий: {games}, полуходов: {plies}, с ошибками: {errors}')
+    print(f'Время: {elapsed:.2f} s, {games / max(elapsed, 1e-9):.1f} партий/с')
+    return errors
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Использование: python pgn.py games.pgn [other.pgn ...]')
+        sys.exit(2)
+    sys.exit(1 if validate(sys.argv[1:]) else 0)
@@ -0,0 +1,237 @@
+"""База статистики позиций
+Для каждой позиции, встретившейся в партиях, база SQLite хранит число партий, в которых она была,
+результаты этих партий и ходы, которые в ней делались. Позиция определяется 64-битным хешем Zobrist
+доски (Board.get_hash), поэтому запрос не разыгрывает партии заново: это поиск по первичному ключу.
+
+Партии загружаются пачками: счетчики сначала складываются в памяти, а затем одной транзакцией
+прибавляются к базе. Позиция и ход считаются один раз за партию, даже если позиция повторялась
+
+Запуск:
+    python positions.py ingest stats.db games.pgn moves.txt games.cga [--batch 10000] [--plies 40]
+    python positions.py query stats.db [--fen "<FEN>"] [--moves e2e4 e7e5]
+"""
+import argparse
+import sqlite3
+import time
+
+from Board import Board
+from archive import GameArchive
+from batch import open_games
+from notation import encode_move, decode_move, parse_san, parse_uci, move_to_uci
+
+# Результат партии -> номер счетчика (белые выиграли, ничья, черные выиграли); '*' учитывается только в числе партий
+RESULT_COLUMNS = {'1-0': 0, '1/2-1/2': 1, '0-1': 2}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER PRIMARY KEY,
+    games INTEGER NOT NULL,
+    white_wins INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    black_wins INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS moves (
+    key INTEGER NOT NULL,
+    move INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    white_wins INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    black_wins INTEGER NOT NULL,
+    PRIMARY KEY (key, move)
+) WITHOUT ROWID;
+'''
+UPSERT_POSITION = '''
+INSERT INTO positions VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET games = games + excluded.games, white_wins = white_wins + excluded.white_wins,
+    draws = draws + excluded.draws, black_wins = black_wins + excluded.black_wins
+'''
+UPSERT_MOVE = '''
+INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (key, move) DO UPDATE SET games = games + excluded.games, white_wins = white_wins + excluded.white_wins,
+    draws = draws + excluded.draws, black_wins = black_wins + excluded.black_wins
+'''
+
+
+def to_sql_key(key) -> int:
+    """SQLite хранит знаковые 64-битные числа, поэтому старшая половина хешей переносится в отрицательные"""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def add_game(counts, column) -> None:
+    """Учесть партию в счетчиках [партий, выигрышей белых, ничьих, выигрышей черных]"""
+    counts[0] += 1
+    if column is not None:
+        counts[column + 1] += 1
+
+
+class PositionCounts:
+    """Статистика позиции или хода из нее: число партий и их результаты"""
+    def __init__(self, games, white_wins, draws, black_wins, move=None):
+        self.games: int = games
+        self.white_wins: int = white_wins
+        self.draws: int = draws
+        self.black_wins: int = black_wins
+        self.move = move  # Ход ((row, col), (row1, col1), promotion), если это статистика хода
+
+
+class PositionDatabase:
+    """База статистики позиций в файле SQLite"""
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        # Журнал WAL: запросы аналитиков не ждут, пока идет загрузка очередной пачки
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def lookup(self, board: Board, limit=10) -> tuple[PositionCounts | None, list[PositionCounts]]:
+        """Статистика позиции доски и самые частые ходы из нее (не больше limit)"""
+        key = to_sql_key(board.get_hash())
+        row = self.connection.execute('SELECT games, white_wins, draws, black_wins FROM positions WHERE key = ?',
+                                      (key,)).fetchone()
+        if row is None:
+            return None, []
+        rows = self.connection.execute('SELECT move, games, white_wins, draws, black_wins FROM moves WHERE key = ? '
+                                       'ORDER BY games DESC LIMIT ?', (key, limit)).fetchall()
+        moves = [PositionCounts(*counts, move=decode_move(code)) for code, *counts in rows]
+        return PositionCounts(*row), moves
+
+    def ingest(self, games, batch_size=10000, max_plies=None) -> tuple[int, int]:
+        """Загрузить партии и вернуть число загруженных и пропущенных партий
+        games - итерируемое пар (результат, генератор пар (хеш позиции, код хода или None для последней позиции)),
+        вместо генератора может быть None - такая партия пропускается (см. read_games)"""
+        positions: dict[int, list[int]] = {}
+        moves: dict[tuple[int, int], list[int]] = {}
+        count = skipped = 0
+        for result, keys in games:
+            if keys is None:
+                skipped += 1
+                continue
+            column = RESULT_COLUMNS.get(result)
+            seen = set()
+            for ply, (key, code) in enumerate(keys):
+                if max_plies is not None and ply > max_plies:
+                    break
+                key = to_sql_key(key)
+                if key not in seen:
+                    seen.add(key)
+                    add_game(positions.setdefault(key, [0, 0, 0, 0]), column)
+                if code is not None and (key, code) not in seen:
+                    seen.add((key, code))
+                    add_game(moves.setdefault((key, code), [0, 0, 0, 0]), column)
+
+            count += 1
+            if count % batch_size == 0:
+                self.flush(positions, moves)
+        self.flush(positions, moves)
+        return count, skipped
+
+    def flush(self, positions, moves) -> None:
+        """Прибавить накопленные счетчики к базе одной транзакцией и очистить их"""
+        with self.connection:
+            self.connection.executemany(UPSERT_POSITION, ((key, *counts) for key, counts in positions.items()))
+            self.connection.executemany(UPSERT_MOVE, ((key, code, *counts) for (key, code), counts in moves.items()))
+        positions.clear()
+        moves.clear()
+
+
+def game_keys(board: Board, moves, parse=None):
+    """Генератор пар (хеш позиции, код хода) по ходу партии и (хеш, None) для позиции после последнего хода
+    moves - ходы в виде кортежей или, если передан parse, в виде записей, которые parse переводит в ходы.
+    Генератор останавливается на первом невозможном ходе"""
+    for move in moves:
+        if parse is not None:
+            move = parse(board, move)
+            if move is None:
+                break
+        yield board.get_hash(), encode_move(move)
+        board.push(move)
+    yield board.get_hash(), None
+
+
+def game_board(start_board: Board, backend, fen) -> Board | None:
+    """Доска для партии: start_board, возвращенная в начальную позицию, если fen не задан,
+    иначе новая доска в позиции fen или None, если такой позиции не бывает"""
+    if fen is None:
+        start_board.reset()
+        return start_board
+    try:
+        return Board.create(backend, fen)
+    except ValueError:
+        return None
+
+
+def read_games(paths, walk=game_keys, backend='field'):
+    """Генератор пар (результат, генератор хешей и ходов) для файлов PGN, списков ходов и архивов *.cga
+    Партии из начальной позиции разыгрываются на одной доске через push, без лишних проверок правил.
+    walk(board, moves, parse=None) - что выдавать по ходу партии, по умолчанию хеши и коды ходов (game_keys).
+    Для партии с невозможной начальной позицией FEN вместо генератора выдается None"""
+    start_board = Board.create(backend)
+    for path in paths:
+        if path.lower().endswith('.cga'):
+            with GameArchive(path) as archive:
+                for game in archive:
+                    board = game_board(start_board, backend, game.fen)
+                    yield game.result, walk(board, game.moves()) if board is not None else None
+            continue
+
+        parse = parse_san if path.lower().endswith('.pgn') else parse_uci
+        for game in open_games(path):
+            board = game_board(start_board, backend, game.start_fen())
+            yield game.result, walk(board, game.moves, parse) if board is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='База статистики позиций')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help='загрузить партии в базу')
+    ingest.add_argument('database', help='файл базы SQLite')
+    ingest.add_argument('paths', nargs='+', help='файлы PGN (*.pgn), архивы (*.cga) или списки ходов')
+    ingest.add_argument('--batch', type=int, default=10000, help='число партий в одной транзакции')
+    ingest.add_argument('--plies', type=int, default=None, help='сколько первых полуходов партии учитывать')
+
+    query = commands.add_parser('query', help='показать статистику позиции')
+    query.add_argument('database', help='файл базы SQLite')
+    query.add_argument('--fen', default=None, help='позиция в нотации FEN')
+    query.add_argument('--moves', nargs='*', default=[], help='ходы в длинной нотации')
+    query.add_argument('--limit', type=int, default=10, help='сколько ходов показать')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with PositionDatabase(args.database) as database:
+        if args.command == 'ingest':
+            count, skipped = database.ingest(read_games(args.paths), args.batch, args.plies)
+            print(f'Партий: {count}, пропущено с невозможной позицией FEN: {skipped}, '
+                  f'{time.perf_counter() - start:.2f} s')
+            return
+
+        board = Board.create(fen=args.fen)
+        for text in args.moves:
+            move = parse_uci(board, text)
+            if move is None:
+                print(f'Невозможный ход: {text}')
+                return
+            board.push(move)
+
+        position, moves = database.lookup(board, args.limit)
+        elapsed = time.perf_counter() - start
+        if position is None:
+            print('Позиции нет в базе')
+            return
+        print(f'Партий: {position.games}, белые выиграли: {position.white_wins}, ничьих: {position.draws}, '
+              f'черные выиграли: {position.black_wins}')
+        for counts in moves:
+            print(f'  {move_to_uci(counts.move):<6} {counts.games:>8} {counts.white_wins:>8} {counts.draws:>8} '
+                  f'{counts.black_wins:>8}')
+        print(f'Запрос: {elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Счетчики вызовов и времени для медленных мест правил игры
+Когда счетчики включены, методы Board и фигур подменяются обертками, которые считают вызовы и время,
+а после каждого хода (вызова update_game_over) печатается отчет и счетчики обнуляются.
+Когда счетчики выключены, в классах стоят исходные методы, поэтому они ничего не стоят.
+Время метода включает вложенные вызовы: possible_move включает время player_checks_himself
+
+Включение:
+    CHESS_PROFILE=1 python main.py          -- с создания первой доски до конца работы программы, отчет в stderr
+
+    with instrument():                        -- на время блока
+        board.move_piece(1, 4, 3, 4)
+"""
+import os
+import sys
+import time
+
+from Board import Board
+from Pieces import Piece, Pawn, Rook, Knight, Bishop, Queen, King
+from notation import move_to_uci
+
+PROFILE_ENV = 'CHESS_PROFILE'
+BOARD_METHODS = ('get_full_copy', 'is_under_attack', 'square_attacked_by', 'possible_move', 'player_checks_himself',
+                 'pins_and_checks', 'update_game_over', 'get_targets')
+PIECE_METHODS = ('can_move', 'can_attack', 'get_targets')
+PIECE_CLASSES = (Piece, Pawn, Rook, Knight, Bishop, Queen, King)
+# После этого метода ход закончен и печатается отчет
+REPORT_METHOD = 'update_game_over'
+
+
+class Profiler:
+    """Подменяет методы обертками со счетчиками и печатает отчет после каждого хода"""
+    def __init__(self, output=sys.stderr):
+        self.output = output
+        self.stats: dict[str, list] = {}  # Имя метода -> [число вызовов, время в секундах]
+        self.originals: list[tuple[type, str, object]] = []
+        self.started = time.perf_counter()
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def enable(self) -> None:
+        """Подменить методы обертками"""
+        if self.originals:
+            return None
+        from BitBoard import BitBoard  # Не в начале модуля: профайлер включается из Board.py (enable_profiler_once)
+
+        targets = [(cls, BOARD_METHODS) for cls in (Board, BitBoard)]
+        targets += [(cls, PIECE_METHODS) for cls in PIECE_CLASSES]
+        for cls, methods in targets:
+            for method in methods:
+                if method in cls.__dict__:
+                    function = cls.__dict__[method]
+                    self.originals.append((cls, method, function))
+                    setattr(cls, method, self.wrap(f'{cls.__name__}.{method}', function, method == REPORT_METHOD))
+        self.reset()
+
+    def disable(self) -> None:
+        """Вернуть исходные методы"""
+        for cls, method, function in self.originals:
+            setattr(cls, method, function)
+        self.originals = []
+
+    def wrap(self, name, function, report_after):
+        """Обертка, которая считает вызовы и время метода function"""
+        stats = self.stats
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                entry = stats.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += perf_counter() - start
+                if report_after:
+                    self.write_report(args[0])
+
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def reset(self) -> None:
+        """Обнулить счетчики"""
+        self.stats.clear()
+        self.started = time.perf_counter()
+
+    def report(self, board: Board | None = None) -> str:
+        """Отчет о вызовах с прошлого обнуления, самые долгие методы первыми"""
+        elapsed = time.perf_counter() - self.started
+        title = 'Ход'
+        if board is not None and board.move_stack:
+            title += f' {len(board.move_stack)}. {move_to_uci(board.move_stack[-1][0])}'
+        lines = [f'{title}: {elapsed * 1000:.1f} ms']
+        for name, (calls, total) in sorted(self.stats.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f'  {name:<32} {calls:>8} вызовов {total * 1000:>10.2f} ms {total / calls * 1e6:>10.1f} мкс')
+        return '\n'.join(lines)
+
+    def write_report(self, board: Board) -> None:
+        """Напечатать отчет о прошедшем ходе и обнулить счетчики
+        update_game_over вызывается и при создании доски из FEN, тогда отчет не печатается"""
+        if board.move_stack:
+            print(self.report(board), file=self.output, flush=True)
+        self.reset()
+
+
+# Профайлер, включенный переменной окружения, или None
+_environment_profiler: Profiler | None = None
+
+
+def instrument(output=sys.stderr) -> Profiler:
+    """Профайлер для блока with: методы подменяются на входе в блок и возвращаются на выходе"""
+    return Profiler(output)
+
+
+def enable_from_environment() -> Profiler | None:
+    """Включить счетчики до конца работы программы, если задана переменная окружения CHESS_PROFILE"""
+    global _environment_profiler
+    if os.environ.get(PROFILE_ENV) and _environment_profiler is None:
+        _environment_profiler = Profiler()
+        _environment_profiler.enable()
+    return _environment_profiler
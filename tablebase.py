@@ -0,0 +1,938 @@
+"""Эндшпильные таблицы для окончаний из трех и четырех фигур (KQK, KRK, KPK, KBNK, KQKR и т.д.)
+Для каждой позиции окончания таблица хранит один байт: ничья, выигрыш или проигрыш игрока, который ходит,
+и число полуходов до мата при лучшей игре обеих сторон.
+
+Позиции нумеруются плотно: очередь хода, клетка белого короля и клетки остальных фигур по порядку
+(белый король, белые фигуры, черный король, черные фигуры) как цифры в системе счисления по основанию 64.
+Позиции, которые переходят друг в друга поворотом или отражением доски, имеют одинаковую оценку, поэтому
+белый король ставится в треугольник a1-d1-d4 (если есть пешки - только отражение по вертикали, король на a-d),
+а из равных вариантов берется наименьший номер.
+
+Таблица строится ретроградным анализом: сначала один проход по всем позициям находит маты и считает ходы
+каждой позиции, ходы со взятием и превращением сразу оцениваются по таблицам меньших окончаний.
+Затем позиции разбираются по возрастанию числа полуходов до мата, и от каждой решенной позиции
+по обратным ходам находятся предыдущие: если решенная позиция проигрышная, предыдущая выигрывает,
+если выигрышная - у предыдущей уменьшается число неопровергнутых ходов, а когда оно доходит до нуля,
+предыдущая позиция проигрывает. Все, что не решено, - ничья.
+Ходы считаются по битовым маскам из BitBoard.py без создания досок и фигур.
+Если установлен numpy (requirements-optional.txt), те же проходы делаются над массивами сразу для тысяч позиций
+(VectorGenerator): таблица получается байт в байт такой же, но в десятки раз быстрее.
+Без numpy позиции перебираются по одной в цикле Python, и таблицы из четырех фигур строятся минутами.
+Взятие на проходе и рокировка в таблицах не учитываются: такие позиции не оцениваются
+
+Запуск:
+    python tablebase.py build KQK KRK KPK KBNK [--dir tablebases]
+    python tablebase.py probe --fen "<FEN>" [--dir tablebases]
+"""
+import argparse
+import mmap
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Без numpy таблицы строятся циклом по позициям (Tablebases.generate_values)
+
+from BitBoard import KING_MASKS, KNIGHT_MASKS, PAWN_ATTACK_MASKS, ROOK_RAYS, BISHOP_RAYS, slide_mask
+from Board import Board
+from colors import WHITE, BLACK, opponent
+from notation import move_to_uci
+from Pieces import (ROOK_DIRECTIONS, BISHOP_DIRECTIONS, QUEEN_DIRECTIONS, RAYS, ROOK_BETWEEN, BISHOP_BETWEEN,
+                    KNIGHT_TARGETS, KING_TARGETS, PAWN_CAPTURE_TARGETS)
+
+# Порядок фигур в названии окончания, от самой сильной
+ORDER = 'QRBNP'
+PROMOTIONS = 'QRBN'
+MAX_PIECES = 4
+# Значения байта: 0 - ничья, 1..127 - выигрыш через столько полуходов, LOSS + n - проигрыш через n полуходов
+DRAW = 0
+LOSS = 128
+INVALID = 255
+# Отметка счетчика ходов позиции, которая не может проиграть: у нее есть ход в ничью или в выигрыш
+CANNOT_LOSE = 255
+DEFAULT_TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+# Сколько позиций VectorGenerator обрабатывает одним набором массивов
+VECTOR_CHUNK = 1 << 16
+# Отметка позиции, которой VectorGenerator еще не назначил полуход решения
+NOT_SCHEDULED = 0xFFFF
+
+
+def square_transform(flip_rows, flip_cols, swap) -> tuple[int, ...]:
+    """Таблица перевода клеток при отражении доски и повороте относительно диагонали a1-h8"""
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        if swap:
+            row, col = col, row
+        if flip_rows:
+            row = 7 - row
+        if flip_cols:
+            col = 7 - col
+        table.append(row * 8 + col)
+    return tuple(table)
+
+
+ALL_TRANSFORMS = [square_transform(flip_rows, flip_cols, swap)
+                  for swap in (False, True) for flip_rows in (False, True) for flip_cols in (False, True)]
+MIRROR_TRANSFORMS = [square_transform(False, False, False), square_transform(False, True, False)]
+# Клетки белого короля: треугольник a1-d1-d4 без пешек и левая половина доски с пешками
+TRIANGLE = tuple(row * 8 + col for row in range(4) for col in range(row, 4))
+LEFT_HALF = tuple(row * 8 + col for row in range(8) for col in range(4))
+
+
+def attacks(char, color, square, occupied) -> int:
+    """Маска клеток, которые атакует фигура char цвета color с клетки square"""
+    if char == 'K':
+        return KING_MASKS[square]
+    if char == 'N':
+        return KNIGHT_MASKS[square]
+    if char == 'P':
+        return PAWN_ATTACK_MASKS[color][square]
+    mask = 0
+    if char in 'RQ':
+        mask |= slide_mask(square, occupied, ROOK_RAYS)
+    if char in 'BQ':
+        mask |= slide_mask(square, occupied, BISHOP_RAYS)
+    return mask
+
+
+def material_name(white, black) -> tuple[str, bool]:
+    """Название окончания по фигурам сторон (без королей) и признак того, что стороны надо поменять местами
+    В названии первой идет сильнейшая сторона: больше фигур, а при равном числе - более сильные фигуры"""
+    white = ''.join(sorted(white, key=ORDER.index))
+    black = ''.join(sorted(black, key=ORDER.index))
+    strength = lambda chars: (-len(chars), [ORDER.index(char) for char in chars])
+    if strength(black) < strength(white):
+        return 'K' + black + 'K' + white, True
+    return 'K' + white + 'K' + black, False
+
+
+def decode_value(value) -> tuple[int, int]:
+    """Перевести байт таблицы в пару (результат для игрока, который ходит: 1, 0 или -1; полуходов до мата)"""
+    if value == DRAW:
+        return 0, 0
+    if value < LOSS:
+        return 1, value
+    return -1, value - LOSS
+
+
+class Table:
+    """Таблица одного окончания: нумерация позиций и байты оценок"""
+    def __init__(self, material, data=None):
+        self.material = material
+        white, black = material[1:].split('K')
+        self.chars = ('K',) + tuple(white) + ('K',) + tuple(black)
+        self.colors = (WHITE,) * (len(white) + 1) + (BLACK,) * (len(black) + 1)
+        self.black_king = len(white) + 1
+        pawns = 'P' in material
+        self.king_squares = LEFT_HALF if pawns else TRIANGLE
+        self.king_codes = {square: code for code, square in enumerate(self.king_squares)}
+        transforms = MIRROR_TRANSFORMS if pawns else ALL_TRANSFORMS
+        self.symmetries = transforms
+        # Для каждой клетки белого короля - преобразования, которые переводят его в разрешенные клетки
+        self.transforms = [[transform for transform in transforms if transform[square] in self.king_codes]
+                           for square in range(64)]
+        # Число позиций при одной очереди хода
+        self.size = len(self.king_squares) * 64 ** (len(self.chars) - 1)
+        self.data = data
+
+    def index(self, squares, turn) -> int:
+        """Номер позиции: squares - клетки фигур в порядке таблицы, turn - 0, если ходят белые, 1 - черные"""
+        best = self.size
+        for transform in self.transforms[squares[0]]:
+            index = self.king_codes[transform[squares[0]]]
+            for square in squares[1:]:
+                index = index * 64 + transform[square]
+            best = min(best, index)
+        return turn * self.size + best
+
+    def position(self, index) -> tuple[list[int], int]:
+        """Клетки фигур и очередь хода по номеру позиции"""
+        turn, index = divmod(index, self.size)
+        squares = []
+        for _ in range(len(self.chars) - 1):
+            index, square = divmod(index, 64)
+            squares.append(square)
+        squares.append(self.king_squares[index])
+        squares.reverse()
+        return squares, turn
+
+    def value(self, squares, turn) -> int:
+        """Байт оценки позиции"""
+        return self.data[self.index(squares, turn)]
+
+    def is_valid(self, squares, turn) -> bool:
+        """Фигуры на разных клетках, пешки не на крайних горизонталях, король стороны, которая не ходит, не под боем"""
+        if len(set(squares)) != len(squares):
+            return False
+        for char, square in zip(self.chars, squares):
+            if char == 'P' and not 8 <= square < 56:
+                return False
+        return not self.in_check(squares, WHITE if turn else BLACK)
+
+    def in_check(self, squares, color) -> bool:
+        """Находится ли король цвета color под боем"""
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        king = squares[0 if color == WHITE else self.black_king]
+        for char, piece_color, square in zip(self.chars, self.colors, squares):
+            if piece_color != color and attacks(char, piece_color, square, occupied) >> king & 1:
+                return True
+        return False
+
+    def moves(self, squares, turn):
+        """Генератор допустимых ходов: (номер фигуры, клетка, куда она идет, номер взятой фигуры или None,
+        фигура превращения или None)"""
+        color = BLACK if turn else WHITE
+        occupied = own = 0
+        for piece_color, square in zip(self.colors, squares):
+            occupied |= 1 << square
+            if piece_color == color:
+                own |= 1 << square
+
+        for i, (char, piece_color, square) in enumerate(zip(self.chars, self.colors, squares)):
+            if piece_color != color:
+                continue
+            if char == 'P':
+                step = 8 if color == WHITE else -8
+                targets = PAWN_ATTACK_MASKS[color][square] & occupied & ~own
+                if not occupied >> (square + step) & 1:
+                    targets |= 1 << (square + step)
+                    start_row = 1 if color == WHITE else 6
+                    if square // 8 == start_row and not occupied >> (square + 2 * step) & 1:
+                        targets |= 1 << (square + 2 * step)
+            else:
+                targets = attacks(char, color, square, occupied) & ~own
+
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                target = low.bit_length() - 1
+                captured = squares.index(target) if occupied & low else None
+                new_squares = list(squares)
+                new_squares[i] = target
+                if captured is not None:
+                    new_squares[captured] = -1
+                if self.in_check_after(new_squares, color):
+                    continue
+                if char == 'P' and target // 8 in (0, 7):
+                    for promotion in PROMOTIONS:
+                        yield i, target, captured, promotion
+                else:
+                    yield i, target, captured, None
+
+    def in_check_after(self, squares, color) -> bool:
+        """in_check для позиции, в которой взятые фигуры отмечены клеткой -1"""
+        occupied = 0
+        for square in squares:
+            if square >= 0:
+                occupied |= 1 << square
+        king = squares[0 if color == WHITE else self.black_king]
+        for char, piece_color, square in zip(self.chars, self.colors, squares):
+            if piece_color != color and square >= 0 and attacks(char, piece_color, square, occupied) >> king & 1:
+                return True
+        return False
+
+    def predecessors(self, index) -> set[int]:
+        """Номера позиций, из которых в позицию index ведет ход без взятия и превращения"""
+        squares, turn = self.position(index)
+        color = WHITE if turn else BLACK  # Цвет того, кто сделал последний ход
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+
+        found = set()
+        for i, (char, piece_color, square) in enumerate(zip(self.chars, self.colors, squares)):
+            if piece_color != color:
+                continue
+            if char == 'P':
+                step = -8 if color == WHITE else 8
+                origins = 0
+                if 8 <= square + step < 56 and not occupied >> (square + step) & 1:
+                    origins |= 1 << (square + step)
+                    double_row = 3 if color == WHITE else 4
+                    if square // 8 == double_row and not occupied >> (square + 2 * step) & 1:
+                        origins |= 1 << (square + 2 * step)
+            else:
+                origins = attacks(char, color, square, occupied) & ~occupied
+
+            while origins:
+                low = origins & -origins
+                origins ^= low
+                new_squares = list(squares)
+                new_squares[i] = low.bit_length() - 1
+                found.add(self.index(new_squares, 1 - turn))
+        return found
+
+
+class VectorGeometry:
+    """Таблицы ходов в виде массивов numpy: клетки прыжков и лучей, клетки между двумя клетками, атаки
+    Все строится из таблиц клеток Pieces, как и ходы обычной доски"""
+    def __init__(self):
+        self.bits = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+        # Клетки прыжков: массив (номер прыжка, клетка) -> клетка, куда ведет прыжок, или -1
+        self.jumps = {'K': self.cell_slots(KING_TARGETS), 'N': self.cell_slots(KNIGHT_TARGETS)}
+        # Лучи: для каждого направления массив (расстояние - 1, клетка) -> клетка луча или -1
+        rays = {direction: self.cell_slots(RAYS[direction], 7) for direction in QUEEN_DIRECTIONS}
+        self.rays = {'R': [rays[direction] for direction in ROOK_DIRECTIONS],
+                     'B': [rays[direction] for direction in BISHOP_DIRECTIONS],
+                     'Q': [rays[direction] for direction in QUEEN_DIRECTIONS]}
+        # Взятия пешки: (цвет) -> массив (влево или вправо, клетка) -> клетка или -1
+        self.pawn_captures = {color: self.cell_slots(PAWN_CAPTURE_TARGETS[color]) for color in (WHITE, BLACK)}
+
+        # Атаки: [откуда, куда] -> bool; для дальнобойных фигур - лежат ли клетки на одной линии
+        self.attack_tables = {'K': self.cell_table(KING_TARGETS), 'N': self.cell_table(KNIGHT_TARGETS),
+                              WHITE: self.cell_table(PAWN_CAPTURE_TARGETS[WHITE]),
+                              BLACK: self.cell_table(PAWN_CAPTURE_TARGETS[BLACK])}
+        self.lines = {'R': np.zeros((64, 64), dtype=bool), 'B': np.zeros((64, 64), dtype=bool)}
+        # Маска клеток строго между двумя клетками одной линии
+        self.between = np.zeros((64, 64), dtype=np.uint64)
+        for char, between_cells in (('R', ROOK_BETWEEN), ('B', BISHOP_BETWEEN)):
+            for square in range(64):
+                for target, cells in between_cells[square].items():
+                    self.lines[char][square, target] = True
+                    self.between[square, target] = sum(1 << (row * 8 + col) for row, col in cells)
+        self.lines['Q'] = self.lines['R'] | self.lines['B']
+
+    @staticmethod
+    def cell_slots(cells_table, size=None) -> 'np.ndarray':
+        """Массив (номер клетки в списке, клетка) -> клетка по таблице клеток Pieces, пустые места заполнены -1
+        Для прыжков номер - номер прыжка, для лучей - расстояние - 1"""
+        slots = np.full((size or max(map(len, cells_table)), 64), -1, dtype=np.int64)
+        for square, cells in enumerate(cells_table):
+            for i, (row, col) in enumerate(cells):
+                slots[i, square] = row * 8 + col
+        return slots
+
+    @staticmethod
+    def cell_table(cells_table) -> 'np.ndarray':
+        """Массив [клетка, клетка из таблицы Pieces] -> bool"""
+        table = np.zeros((64, 64), dtype=bool)
+        for square, cells in enumerate(cells_table):
+            for row, col in cells:
+                table[square, row * 8 + col] = True
+        return table
+
+    def attacks(self, char, color, squares, targets, occupied) -> 'np.ndarray':
+        """Атакует ли фигура char цвета color с клеток squares клетки targets при занятых клетках occupied"""
+        if char == 'P':
+            return self.attack_tables[color][squares, targets]
+        if char in 'KN':
+            return self.attack_tables[char][squares, targets]
+        return self.lines[char][squares, targets] & (self.between[squares, targets] & occupied == 0)
+
+
+# Таблицы ходов строятся при первом построении таблицы окончания
+_vector_geometry: VectorGeometry | None = None
+
+
+def sorted_unique(values, return_counts=False):
+    """Различные значения массива по возрастанию и, если нужно, сколько раз каждое встретилось
+    Как np.unique, но только сортировкой: np.unique новых версий ищет значения хешем, и на миллионах
+    номеров позиций это в десятки раз медленнее"""
+    values = np.sort(values)
+    first = np.flatnonzero(np.concatenate((values[:1] == values[:1], values[1:] != values[:-1])))
+    if return_counts:
+        return values[first], np.diff(np.append(first, len(values)))
+    return values[first]
+
+
+class VectorGenerator:
+    """Построение таблицы окончания массивами numpy
+    Алгоритм тот же, что в Tablebases.generate_values, но каждый шаг делается сразу для пачки позиций:
+    вместо цикла по позициям идет цикл по фигурам и их возможным ходам (прыжкам, клеткам лучей)"""
+    def __init__(self, tablebases, table: Table):
+        global _vector_geometry
+        if _vector_geometry is None:
+            _vector_geometry = VectorGeometry()
+        self.geometry = _vector_geometry
+        self.tablebases = tablebases
+        self.table = table
+        self.size = 2 * table.size
+        self.index_tables: dict[str, tuple] = {}
+        self.data: dict[str, object] = {}
+
+    def decode(self, indices) -> list:
+        """Клетки фигур позиций с номерами indices (как Table.position, но для массива номеров)"""
+        rest = indices % self.table.size
+        squares = []
+        for _ in range(len(self.table.chars) - 1):
+            squares.append(rest % 64)
+            rest = rest // 64
+        squares.append(np.array(self.table.king_squares, dtype=np.int64)[rest])
+        squares.reverse()
+        return squares
+
+    def index(self, table: Table, squares, turn) -> 'np.ndarray':
+        """Номера позиций таблицы table (как Table.index, но для массивов клеток)"""
+        if table.material not in self.index_tables:
+            codes = np.full(64, -1, dtype=np.int64)
+            codes[list(table.king_squares)] = np.arange(len(table.king_squares))
+            self.index_tables[table.material] = np.array(table.symmetries, dtype=np.int64), codes
+        transforms, codes = self.index_tables[table.material]
+
+        best = None
+        for transform in transforms:
+            code = codes[transform[squares[0]]]
+            index = code
+            for square in squares[1:]:
+                index = index * 64 + transform[square]
+            index = np.where(code >= 0, index, table.size)
+            best = index if best is None else np.minimum(best, index)
+        return best + turn * table.size
+
+    def occupancy(self, squares) -> 'np.ndarray':
+        """Маски занятых клеток; взятые фигуры отмечены клеткой -1"""
+        occupied = np.zeros(len(squares[0]), dtype=np.uint64)
+        for square in squares:
+            occupied |= np.where(square >= 0, self.geometry.bits[square], np.uint64(0))
+        return occupied
+
+    def in_check(self, squares, color, occupied) -> 'np.ndarray':
+        """Находится ли король цвета color под боем (как Table.in_check_after)"""
+        table = self.table
+        king = squares[0 if color == WHITE else table.black_king]
+        check = np.zeros(len(king), dtype=bool)
+        for char, piece_color, square in zip(table.chars, table.colors, squares):
+            if piece_color != color:
+                check |= (square >= 0) & self.geometry.attacks(char, piece_color, square, king, occupied)
+        return check
+
+    def probe(self, pieces, color) -> 'np.ndarray':
+        """Байты оценок из таблиц меньших окончаний (как Tablebases.probe_pieces)
+        pieces - список (цвет, фигура, массив клеток): фигуры одни и те же, меняются только клетки"""
+        white = [(char, square) for piece_color, char, square in pieces if piece_color == WHITE and char != 'K']
+        black = [(char, square) for piece_color, char, square in pieces if piece_color == BLACK and char != 'K']
+        kings = {piece_color: square for piece_color, char, square in pieces if char == 'K'}
+        material, flipped = material_name([char for char, _ in white], [char for char, _ in black])
+        if material == 'KK':
+            return np.full(len(kings[WHITE]), DRAW, dtype=np.uint8)
+        table = self.tablebases.get_table(material)
+        if material not in self.data:
+            self.data[material] = np.frombuffer(table.data, dtype=np.uint8)
+
+        turn = 0 if color == WHITE else 1
+        white_king, black_king = kings[WHITE], kings[BLACK]
+        if flipped:
+            white, black = ([(char, square ^ 56) for char, square in black],
+                            [(char, square ^ 56) for char, square in white])
+            white_king, black_king = black_king ^ 56, white_king ^ 56
+            turn = 1 - turn
+        white.sort(key=lambda item: ORDER.index(item[0]))
+        black.sort(key=lambda item: ORDER.index(item[0]))
+        squares = [white_king] + [square for _, square in white] + [black_king] + [square for _, square in black]
+        return self.data[material][self.index(table, squares, turn)]
+
+    def move_slots(self, char, color, square, occupied, own):
+        """Генератор возможных ходов фигуры по правилу ее хода: пары (клетки, куда идет фигура; маска допустимых)
+        square - массив клеток фигуры, occupied и own - маски всех и своих фигур. Шахи не проверяются"""
+        geometry = self.geometry
+        bits = geometry.bits
+        if char in 'KN':
+            for targets in geometry.jumps[char]:
+                targets = targets[square]
+                yield targets, (targets >= 0) & (own & bits[targets] == 0)
+        elif char == 'P':
+            step = 8 if color == WHITE else -8
+            free = occupied & bits[square + step] == 0
+            yield square + step, free
+            start_row = 1 if color == WHITE else 6
+            double = free & (square // 8 == start_row) & (occupied & bits[(square + 2 * step) % 64] == 0)
+            yield square + 2 * step, double
+            for targets in geometry.pawn_captures[color]:
+                targets = targets[square]
+                yield targets, (targets >= 0) & (occupied & ~own & bits[targets] != 0)
+        else:
+            for ray in geometry.rays[char]:
+                for targets in ray:
+                    targets = targets[square]
+                    free = (targets >= 0) & (geometry.between[square, targets] & occupied == 0)
+                    if not free.any():
+                        break  # Дальше луч везде закрыт или кончилась доска
+                    yield targets, free & (own & bits[targets] == 0)
+
+    def unmove_slots(self, char, color, square, occupied):
+        """Генератор клеток, откуда фигура могла прийти ходом без взятия: пары (клетки, маска допустимых)"""
+        geometry = self.geometry
+        bits = geometry.bits
+        if char in 'KN':
+            for origins in geometry.jumps[char]:
+                origins = origins[square]
+                yield origins, (origins >= 0) & (occupied & bits[origins] == 0)
+        elif char == 'P':
+            step = -8 if color == WHITE else 8
+            single = square + step
+            free = (single >= 8) & (single < 56) & (occupied & bits[single % 64] == 0)
+            yield single, free
+            double_row = 3 if color == WHITE else 4
+            double = free & (square // 8 == double_row) & (occupied & bits[(square + 2 * step) % 64] == 0)
+            yield square + 2 * step, double
+        else:
+            for ray in geometry.rays[char]:
+                for origins in ray:
+                    origins = origins[square]
+                    free = (origins >= 0) & (geometry.between[square, origins] & occupied == 0) \
+                        & (occupied & bits[origins] == 0)
+                    if not free.any():
+                        break
+                    yield origins, free
+
+    def run(self) -> bytearray:
+        """Построить байты таблицы; таблицы меньших окончаний уже должны быть построены"""
+        values = np.zeros(self.size, dtype=np.uint8)
+        counters = np.zeros(self.size, dtype=np.uint8)
+        loss_floor = np.zeros(self.size, dtype=np.uint8)
+        # Полуход, на котором позиция будет решена (наименьший из назначенных), вместо словаря buckets
+        scheduled = np.full(self.size, NOT_SCHEDULED, dtype=np.uint16)
+
+        for turn in (0, 1):
+            for start in range(0, self.table.size, VECTOR_CHUNK):
+                indices = np.arange(start, min(start + VECTOR_CHUNK, self.table.size)) + turn * self.table.size
+                self.analyze_positions(indices, turn, values, counters, loss_floor, scheduled)
+
+        plies = 0
+        while (scheduled[values == 0] < NOT_SCHEDULED).any():
+            frontier = np.flatnonzero((values == 0) & (scheduled == plies))
+            values[frontier] = plies if plies % 2 else LOSS + plies
+            for start in range(0, len(frontier), VECTOR_CHUNK):
+                self.solve_predecessors(frontier[start:start + VECTOR_CHUNK], plies, values, counters, loss_floor,
+                                        scheduled)
+            plies += 1
+
+        values[values == INVALID] = DRAW  # Невозможные позиции не запрашиваются, в файле они нули
+        return bytearray(values.tobytes())
+
+    def analyze_positions(self, indices, turn, values, counters, loss_floor, scheduled) -> None:
+        """Первый проход для пачки позиций с одной очередью хода: отметить невозможные, найти маты,
+        оценить взятия и превращения по меньшим таблицам и посчитать различные ходы в позиции этой же таблицы"""
+        table = self.table
+        bits = self.geometry.bits
+        color = BLACK if turn else WHITE
+        squares = self.decode(indices)
+
+        # Фигуры на разных клетках, пешки не на крайних горизонталях, король стороны, которая не ходит,
+        # не под боем, и номер позиции - наименьший среди симметричных
+        valid = np.ones(len(indices), dtype=bool)
+        for i, char in enumerate(table.chars):
+            for j in range(i):
+                valid &= squares[i] != squares[j]
+            if char == 'P':
+                valid &= (squares[i] >= 8) & (squares[i] < 56)
+        occupied = self.occupancy(squares)
+        valid &= ~self.in_check(squares, WHITE if turn else BLACK, occupied)
+        valid &= self.index(table, squares, turn) == indices
+        values[indices[~valid]] = INVALID
+        indices, squares, occupied = indices[valid], [square[valid] for square in squares], occupied[valid]
+        if not len(indices):
+            return None
+
+        own = np.zeros(len(indices), dtype=np.uint64)
+        for piece_color, square in zip(table.colors, squares):
+            if piece_color == color:
+                own |= bits[square]
+
+        best_win = np.full(len(indices), INVALID, dtype=np.int64)
+        worst_loss = np.zeros(len(indices), dtype=np.int64)
+        has_draw = np.zeros(len(indices), dtype=bool)
+        has_moves = np.zeros(len(indices), dtype=bool)
+        positions, successors = [], []
+        for i, (char, piece_color) in enumerate(zip(table.chars, table.colors)):
+            if piece_color != color:
+                continue
+            for targets, possible in self.move_slots(char, color, squares[i], occupied, own):
+                rows = np.flatnonzero(possible)
+                if not len(rows):
+                    continue
+                target = targets[rows]
+                new_squares = [square[rows] for square in squares]
+                new_squares[i] = target
+                captured = np.full(len(rows), -1, dtype=np.int64)
+                for j, other_color in enumerate(table.colors):
+                    if other_color != color:
+                        hit = new_squares[j] == target
+                        captured[hit] = j
+                        new_squares[j] = np.where(hit, -1, new_squares[j])
+
+                legal = ~self.in_check(new_squares, color, self.occupancy(new_squares))
+                rows, target, captured = rows[legal], target[legal], captured[legal]
+                new_squares = [square[legal] for square in new_squares]
+                has_moves[rows] = True
+                promoted = (target // 8 == 0) | (target // 8 == 7) if char == 'P' else np.zeros(len(rows), dtype=bool)
+
+                quiet = (captured < 0) & ~promoted
+                if quiet.any():
+                    positions.append(rows[quiet])
+                    successors.append(self.index(table, [square[quiet] for square in new_squares], 1 - turn))
+
+                # Ход в другое окончание оценивается по его таблице; фигуры в пачке одни и те же
+                for j in set(captured[~quiet].tolist()):
+                    for promotion_move in (False, True):
+                        selected = ~quiet & (captured == j) & (promoted == promotion_move)
+                        if not selected.any():
+                            continue
+                        at = rows[selected]
+                        for promotion in (PROMOTIONS if promotion_move else (None,)):
+                            pieces = [(other_color, promotion if k == i and promotion else other_char,
+                                       new_squares[k][selected])
+                                      for k, (other_char, other_color) in enumerate(zip(table.chars, table.colors))
+                                      if k != j]
+                            value = self.probe(pieces, opponent(color)).astype(np.int64)
+                            best_win[at] = np.minimum(best_win[at], np.where(value >= LOSS, value - LOSS + 1, INVALID))
+                            worst_loss[at] = np.maximum(worst_loss[at], np.where((value > DRAW) & (value < LOSS),
+                                                                                 value + 1, 0))
+                            has_draw[at] |= value == DRAW
+
+        mate = ~has_moves & self.in_check(squares, color, occupied)
+        scheduled[indices[mate]] = 0  # Пат остается ничьей
+        win = has_moves & (best_win < INVALID)
+        scheduled[indices[win]] = best_win[win]
+        cannot_lose = win | (has_moves & has_draw)
+        counters[indices[cannot_lose]] = CANNOT_LOSE
+
+        # Число различных позиций, в которые ведут ходы без взятия и превращения
+        successor_count = np.zeros(len(indices), dtype=np.int64)
+        if positions:
+            pairs = sorted_unique(np.concatenate(positions) * self.size + np.concatenate(successors))
+            successor_count = np.bincount(pairs // self.size, minlength=len(indices))
+        rest = has_moves & ~cannot_lose
+        counters[indices[rest]] = successor_count[rest]
+        loss_floor[indices[rest]] = worst_loss[rest]
+        lost = rest & (successor_count == 0)
+        scheduled[indices[lost]] = worst_loss[lost]
+
+    def solve_predecessors(self, frontier, plies, values, counters, loss_floor, scheduled) -> None:
+        """Обработать предыдущие позиции пачки позиций, решенных за plies полуходов (как цикл по buckets)"""
+        table = self.table
+        pairs = []
+        for turn in (0, 1):
+            part = frontier[(frontier >= table.size) == bool(turn)]
+            if not len(part):
+                continue
+            color = WHITE if turn else BLACK  # Цвет того, кто сделал последний ход
+            squares = self.decode(part)
+            occupied = self.occupancy(squares)
+            for i, (char, piece_color) in enumerate(zip(table.chars, table.colors)):
+                if piece_color != color:
+                    continue
+                for origins, possible in self.unmove_slots(char, color, squares[i], occupied):
+                    rows = np.flatnonzero(possible)
+                    if not len(rows):
+                        continue
+                    new_squares = [square[rows] for square in squares]
+                    new_squares[i] = origins[rows]
+                    pairs.append(part[rows] * self.size + self.index(table, new_squares, 1 - turn))
+        if not pairs:
+            return None
+
+        # Одна решенная позиция учитывается у предыдущей один раз, как множество в Table.predecessors
+        previous = sorted_unique(np.concatenate(pairs)) % self.size
+        previous = previous[values[previous] == 0]
+        if plies % 2 == 0:
+            # Из предыдущей позиции есть ход в проигрыш соперника
+            scheduled[previous] = np.minimum(scheduled[previous], plies + 1)
+            return None
+
+        previous = previous[counters[previous] != CANNOT_LOSE]
+        previous, decrements = sorted_unique(previous, return_counts=True)
+        left = counters[previous].astype(np.int64) - decrements
+        counters[previous] = left
+        lost = previous[left == 0]
+        scheduled[lost] = np.minimum(scheduled[lost], np.maximum(plies + 1, loss_floor[lost]))
+
+
+class Tablebases:
+    """Набор таблиц из одной папки; таблицы открываются через mmap при первом обращении"""
+    def __init__(self, directory=DEFAULT_TABLEBASE_DIR):
+        self.directory = directory
+        self.tables: dict[str, Table | None] = {}
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Закрыть файлы таблиц"""
+        for data, file in self.files:
+            data.close()
+            file.close()
+        self.files = []
+        self.tables = {}
+
+    def path(self, material) -> str:
+        return os.path.join(self.directory, material + '.tb')
+
+    def get_table(self, material) -> Table | None:
+        """Таблица окончания или None, если ее нет в папке"""
+        if material not in self.tables:
+            table = None
+            if os.path.exists(self.path(material)):
+                table = Table(material)
+                file = open(self.path(material), 'rb')
+                if os.fstat(file.fileno()).st_size != 2 * table.size:
+                    file.close()
+                    raise ValueError(f'Поврежденный файл таблицы: {self.path(material)}')
+                table.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.files.append((table.data, file))
+            self.tables[material] = table
+        return self.tables[material]
+
+    def probe_pieces(self, pieces, color) -> int | None:
+        """Байт оценки позиции из фигур pieces - списка (цвет, фигура, клетка), ходит color
+        None, если таблицы такого окончания нет или у сторон не по одному королю"""
+        white = [(char, square) for piece_color, char, square in pieces if piece_color == WHITE and char != 'K']
+        black = [(char, square) for piece_color, char, square in pieces if piece_color == BLACK and char != 'K']
+        kings = {piece_color: square for piece_color, char, square in pieces if char == 'K'}
+        if len(kings) != 2 or sum(char == 'K' for _, char, _ in pieces) != 2:
+            return None  # Позиция без короля или с лишним королем
+        material, flipped = material_name([char for char, _ in white], [char for char, _ in black])
+        if material == 'KK':
+            return DRAW
+        table = self.get_table(material)
+        if table is None:
+            return None
+
+        turn = 0 if color == WHITE else 1
+        white_king, black_king = kings[WHITE], kings[BLACK]
+        if flipped:
+            # Стороны меняются цветами, доска отражается по горизонтали
+            white, black = ([(char, square ^ 56) for char, square in black],
+                            [(char, square ^ 56) for char, square in white])
+            white_king, black_king = black_king ^ 56, white_king ^ 56
+            turn = 1 - turn
+        white.sort(key=lambda item: ORDER.index(item[0]))
+        black.sort(key=lambda item: ORDER.index(item[0]))
+        squares = [white_king] + [square for _, square in white] + [black_king] + [square for _, square in black]
+        return table.value(squares, turn)
+
+    def probe(self, board: Board) -> tuple[int, int] | None:
+        """Результат для игрока, который ходит (1, 0 или -1), и число полуходов до мата
+        None, если позиции нет в таблицах: слишком много фигур, нет таблицы, есть рокировка или взятие на проходе"""
+        pieces = []
+        for row in range(8):
+            for col in range(8):
+                piece = board.get_piece(row, col)
+                if piece is not None:
+                    pieces.append((piece.get_color(), piece.char(), row * 8 + col))
+                    if len(pieces) > MAX_PIECES:
+                        return None
+        if board.castling_rights() or self.en_passant_possible(board):
+            return None
+
+        value = self.probe_pieces(pieces, board.current_player_color())
+        if value is None:
+            return None
+        return decode_value(value)
+
+    @staticmethod
+    def en_passant_possible(board: Board) -> bool:
+        """Есть ли у игрока, который ходит, взятие на проходе"""
+        if board.en_passant_square is None:
+            return False
+        row, col = board.en_passant_square
+        for col1 in (col - 1, col + 1):
+            if 0 <= col1 < 8 and board.get_piece(row, col1) is not None and board.get_piece(row, col1).char() == 'P':
+                for _, (row2, col2), _ in board.legal_moves_from(row, col1):
+                    if col2 == col and board.get_piece(row2, col2) is None:
+                        return True
+        return False
+
+    def best_move(self, board: Board) -> tuple[tuple, int, int] | None:
+        """Лучший ход по таблицам: (ход, результат для игрока, который ходит, полуходов до мата) или None
+        Выигрывающая сторона ставит мат быстрее всего, проигрывающая оттягивает его как можно дольше"""
+        if self.probe(board) is None:
+            return None
+
+        best = None
+        best_key = None
+        for move in list(board.legal_moves()):
+            board.push(move)
+            try:
+                answer = self.probe(board)
+            finally:
+                board.pop()
+            if answer is None:
+                return None
+            result, plies = -answer[0], answer[1] + 1
+            # Сначала выигрыш с самым коротким матом, затем ничья, затем проигрыш с самым длинным
+            key = (result, -plies if result > 0 else plies)
+            if best_key is None or key > best_key:
+                best, best_key = (move, result, plies if result else 0), key
+        return best
+
+    def generate(self, material, verbose=False, vectorized=None) -> Table:
+        """Построить таблицу окончания ретроградным анализом и сохранить ее в папку
+        Таблицы меньших окончаний, в которые можно перейти взятием или превращением, строятся при необходимости.
+        vectorized - строить ли таблицу массивами numpy; по умолчанию - если numpy установлен"""
+        start = time.perf_counter()
+        table = Table(material)
+        # Таблицы, в которые ведут взятия и превращения, должны быть готовы до прохода по позициям
+        for sub_material in self.sub_materials(table):
+            if self.get_table(sub_material) is None:
+                self.generate(sub_material, verbose, vectorized)
+
+        if vectorized is None:
+            vectorized = np is not None
+        values = VectorGenerator(self, table).run() if vectorized else self.generate_values(table)
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(material), 'wb') as file:
+            file.write(values)
+        table.data = values
+        self.tables[material] = table
+        if verbose:
+            wins = [value for value in values if 0 < value < LOSS]
+            print(f'{material}: {len(values)} позиций, выигрышей {len(wins)}, '
+                  f'самый длинный мат {max(wins, default=0)} полуходов, {time.perf_counter() - start:.1f} s')
+        return table
+
+    def generate_values(self, table: Table) -> bytearray:
+        """Байты таблицы, посчитанные циклом по позициям; таблицы меньших окончаний уже должны быть построены"""
+        size = 2 * table.size
+        values = bytearray(size)
+        counters = bytearray(size)
+        loss_floor = bytearray(size)  # Самый длинный проигрыш среди ходов со взятием и превращением
+        buckets: dict[int, list[int]] = {}
+
+        for index in range(size):
+            squares, turn = table.position(index)
+            if not table.is_valid(squares, turn) or table.index(squares, turn) != index:
+                values[index] = INVALID
+                continue
+
+            color = BLACK if turn else WHITE
+            successors = set()
+            best_win = None
+            worst_loss = 0
+            has_draw = False
+            has_moves = False
+            for i, target, captured, promotion in table.moves(squares, turn):
+                has_moves = True
+                if captured is None and promotion is None:
+                    new_squares = list(squares)
+                    new_squares[i] = target
+                    successors.add(table.index(new_squares, 1 - turn))
+                    continue
+
+                # Ход в другое окончание оценивается по его таблице
+                pieces = []
+                for j, (char, piece_color, square) in enumerate(zip(table.chars, table.colors, squares)):
+                    if j == captured:
+                        continue
+                    if j == i:
+                        char, square = promotion or char, target
+                    pieces.append((piece_color, char, square))
+                result, plies = decode_value(self.probe_pieces(pieces, BLACK if color == WHITE else WHITE))
+                if result < 0:
+                    best_win = plies + 1 if best_win is None else min(best_win, plies + 1)
+                elif result > 0:
+                    worst_loss = max(worst_loss, plies + 1)
+                else:
+                    has_draw = True
+
+            if not has_moves:
+                if table.in_check(squares, color):
+                    buckets.setdefault(0, []).append(index)  # Мат
+                continue  # Пат остается ничьей
+            if best_win is not None:
+                buckets.setdefault(best_win, []).append(index)
+            if best_win is not None or has_draw:
+                counters[index] = CANNOT_LOSE
+            else:
+                counters[index] = len(successors)
+                loss_floor[index] = worst_loss
+                if not successors:
+                    buckets.setdefault(worst_loss, []).append(index)
+
+        plies = 0
+        while buckets:
+            for index in buckets.pop(plies, []):
+                if values[index]:
+                    continue  # Позиция уже решена за меньшее число полуходов
+                values[index] = plies if plies % 2 else LOSS + plies
+                for previous in table.predecessors(index):
+                    if values[previous]:
+                        continue
+                    if plies % 2 == 0:
+                        # Из предыдущей позиции есть ход в проигрыш соперника
+                        buckets.setdefault(plies + 1, []).append(previous)
+                    elif counters[previous] != CANNOT_LOSE:
+                        counters[previous] -= 1
+                        if counters[previous] == 0:
+                            buckets.setdefault(max(plies + 1, loss_floor[previous]), []).append(previous)
+            plies += 1
+
+        for index in range(size):
+            if values[index] == INVALID:
+                values[index] = DRAW  # Невозможные позиции не запрашиваются, в файле они нули
+        return values
+
+    @staticmethod
+    def sub_materials(table: Table) -> set[str]:
+        """Окончания, в которые можно перейти из окончания table одним взятием или превращением"""
+        white, black = table.material[1:].split('K')
+        found = set()
+        for i in range(len(white)):
+            found.add(material_name(white[:i] + white[i + 1:], black)[0])
+            if white[i] == 'P':
+                for promotion in PROMOTIONS:
+                    found.add(material_name(white[:i] + promotion + white[i + 1:], black)[0])
+        for i in range(len(black)):
+            found.add(material_name(white, black[:i] + black[i + 1:])[0])
+            if black[i] == 'P':
+                for promotion in PROMOTIONS:
+                    found.add(material_name(white, black[:i] + promotion + black[i + 1:])[0])
+        found.discard('KK')
+        return found
+
+
+def open_tablebases(directory=DEFAULT_TABLEBASE_DIR) -> Tablebases | None:
+    """Открыть папку с таблицами, если она есть, иначе вернуть None: компьютер может играть и без таблиц"""
+    if not os.path.isdir(directory):
+        return None
+    return Tablebases(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Эндшпильные таблицы')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='построить таблицы окончаний')
+    build.add_argument('materials', nargs='+', help='окончания, например KQK KRK KPK KBNK')
+    build.add_argument('--dir', default=DEFAULT_TABLEBASE_DIR, help='папка с таблицами')
+
+    probe = commands.add_parser('probe', help='оценить позицию по таблицам')
+    probe.add_argument('--fen', required=True, help='позиция в нотации FEN')
+    probe.add_argument('--dir', default=DEFAULT_TABLEBASE_DIR, help='папка с таблицами')
+    args = parser.parse_args()
+
+    with Tablebases(args.dir) as tablebases:
+        if args.command == 'build':
+            for material in args.materials:
+                material = material.upper()
+                if material.count('K') != 2 or not material.startswith('K') or len(material) > MAX_PIECES \
+                        or any(char not in ORDER for char in material.replace('K', '')):
+                    parser.error(f'неизвестное окончание: {material}')
+                name, _ = material_name(*material[1:].split('K'))
+                tablebases.generate(name, verbose=True)
+            return
+
+        try:
+            board = Board.create(fen=args.fen)
+        except ValueError as error:
+            parser.error(str(error))
+        best = tablebases.best_move(board)
+        if best is None:
+            print('Позиции нет в таблицах')
+            return
+        move, result, plies = best
+        text = {1: f'выигрыш, мат через {plies} полуходов', 0: 'ничья', -1: f'проигрыш, мат через {plies} полуходов'}
+        print(f'{text[result]}, лучший ход: {move_to_uci(move)}')
+
+
+if __name__ == '__main__':
+    main()
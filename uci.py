@@ -0,0 +1,198 @@
+"""Интерфейс UCI для игры без окна
+Программа читает команды из стандартного ввода и отвечает в стандартный вывод, поэтому ее можно подключить
+к шахматной оболочке или менеджеру турниров. Перебор идет в отдельном потоке, чтобы команда stop
+обрабатывалась сразу, пока компьютер думает
+
+Поддерживаются команды:
+    uci, isready, ucinewgame, quit
+    position startpos [moves e2e4 e7e5 ...]
+    position fen <FEN> [moves ...]
+    go [depth N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N] [infinite]
+    stop
+
+Запуск:
+    python uci.py [--backend bitboard] [--book book.bin] [--tablebases tablebases]
+"""
+import argparse
+import sys
+import threading
+
+from Board import Board, START_FEN
+from book import open_book, DEFAULT_BOOK_PATH
+from colors import WHITE
+from engine import search, MATE_SCORE, MATE_THRESHOLD, SearchResult
+from notation import parse_uci, move_to_uci
+from tablebase import open_tablebases, DEFAULT_TABLEBASE_DIR
+
+ENGINE_NAME = 'Chess'
+ENGINE_AUTHOR = 'buj17'
+# Запас времени на передачу хода оболочке, в миллисекундах
+MOVE_OVERHEAD = 50
+# На сколько ходов делится оставшееся время, если оболочка не передала movestogo
+DEFAULT_MOVES_TO_GO = 30
+
+
+def time_for_move(params: dict, color) -> float:
+    """Время на ход в секундах по параметрам команды go; бесконечность, если время не ограничено"""
+    if 'movetime' in params:
+        return max(params['movetime'] - MOVE_OVERHEAD, 1) / 1000
+
+    remaining = params.get('wtime' if color == WHITE else 'btime')
+    if remaining is None:
+        return float('inf')
+    increment = params.get('winc' if color == WHITE else 'binc', 0)
+    moves_to_go = params.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = remaining / max(moves_to_go, 1) + increment / 2
+    # Нельзя тратить больше, чем осталось на часах
+    budget = min(budget, remaining - MOVE_OVERHEAD)
+    return max(budget, 1) / 1000
+
+
+def format_score(result: SearchResult) -> str:
+    """Оценка в формате UCI: сантипешки или число ходов до мата"""
+    if abs(result.score) >= MATE_THRESHOLD:
+        plies = MATE_SCORE - abs(result.score)
+        moves = (plies + 1) // 2
+        return f'mate {moves if result.score > 0 else -moves}'
+    return f'cp {result.score}'
+
+
+class UciEngine:
+    """Состояние программы между командами: текущая позиция и идущий перебор"""
+    def __init__(self, backend='field', output=sys.stdout, book=None, tablebases=None):
+        self.backend = backend
+        self.book = book  # Дебютная книга или None
+        self.tablebases = tablebases  # Эндшпильные таблицы или None
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board = Board.create(backend)
+        self.stop_event = threading.Event()
+        self.search_thread: None | threading.Thread = None
+
+    def send(self, text) -> None:
+        """Отправить строку оболочке; перебор и чтение команд пишут из разных потоков"""
+        with self.output_lock:
+            self.output.write(text + '\n')
+            self.output.flush()
+
+    def handle(self, line) -> bool:
+        """Выполнить одну команду; вернуть False, если программа должна завершиться"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.stop_search()
+            self.board = Board.create(self.backend)
+        elif command == 'position':
+            self.stop_search()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop_search()
+            self.start_search(args)
+        elif command == 'stop':
+            self.stop_search()
+        elif command == 'quit':
+            self.stop_search()
+            return False
+        else:
+            self.send(f'info string unknown command: {command}')
+        return True
+
+    def set_position(self, args) -> None:
+        """position startpos|fen <FEN> [moves ...]"""
+        if 'moves' in args:
+            index = args.index('moves')
+            args, moves = args[:index], args[index + 1:]
+        else:
+            moves = []
+
+        if args and args[0] == 'fen':
+            fen = ' '.join(args[1:])
+        else:
+            fen = START_FEN
+
+        try:
+            board = Board.create(self.backend, fen)
+        except ValueError as error:
+            self.send(f'info string {error}')
+            return None
+
+        for text in moves:
+            move = parse_uci(board, text)
+            if move is None:
+                self.send(f'info string illegal move: {text}')
+                break
+            board.push(move)
+        self.board = board
+
+    def start_search(self, args) -> None:
+        """go ...: разобрать параметры и запустить перебор в отдельном потоке"""
+        params = {}
+        infinite = False
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                infinite = True
+            elif i + 1 < len(args) and args[i + 1].lstrip('-').isdigit():
+                params[args[i]] = int(args[i + 1])
+                i += 1
+            i += 1
+
+        time_limit = float('inf') if infinite else time_for_move(params, self.board.current_player_color())
+        max_depth = params.get('depth', 64)
+
+        self.stop_event.clear()
+        self.search_thread = threading.Thread(target=self.run_search, args=(time_limit, max_depth, infinite),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def run_search(self, time_limit, max_depth, infinite) -> None:
+        """Тело потока перебора: найти ход и сообщить его оболочке"""
+        result = search(self.board, time_limit, max_depth, self.stop_event, self.book, self.tablebases)
+        if result.source != 'book' and result.best_move is not None:
+            pv = ' '.join(move_to_uci(move) for move in result.pv)
+            self.send(f'info depth {result.depth} score {format_score(result)} nodes {result.nodes} '
+                      f'nps {result.nps:.0f} time {result.elapsed * 1000:.0f} pv {pv}')
+        if infinite:
+            # При go infinite ход отправляется только после команды stop
+            self.stop_event.wait()
+        self.send(f'bestmove {move_to_uci(result.best_move) if result.best_move is not None else "0000"}')
+
+    def stop_search(self) -> None:
+        """Остановить идущий перебор и дождаться, пока он отправит ход"""
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Интерфейс UCI')
+    parser.add_argument('--backend', default='field', choices=('field', 'bitboard'), help='способ хранения доски')
+    parser.add_argument('--book', default=DEFAULT_BOOK_PATH, help='файл дебютной книги')
+    parser.add_argument('--tablebases', default=DEFAULT_TABLEBASE_DIR, help='папка с эндшпильными таблицами')
+    args = parser.parse_args()
+
+    book = open_book(args.book)
+    tablebases = open_tablebases(args.tablebases)
+    engine = UciEngine(args.backend, book=book, tablebases=tablebases)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop_search()
+    if book is not None:
+        book.close()
+    if tablebases is not None:
+        tablebases.close()
+
+
+if __name__ == '__main__':
+    main()
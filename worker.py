@@ -0,0 +1,94 @@
+"""Фоновый процесс для перебора и анализа позиции
+Интерфейс Tk не должен ждать, пока компьютер думает: задания отправляются в отдельный процесс через очередь,
+а результаты забираются из другой очереди периодическим опросом (master.after).
+Доска передается в процесс целиком, вместе с историей ходов.
+Когда позиция на экране меняется, все отправленные задания отменяются: идущий перебор останавливается,
+а результаты устаревших заданий отбрасываются
+"""
+import multiprocessing
+import queue
+
+from book import open_book
+from engine import search
+from tablebase import open_tablebases
+
+
+def worker_loop(requests, results, stop_event, generation) -> None:
+    """Цикл фонового процесса: выполнять задания, пока не придет None"""
+    book = open_book()
+    tablebases = open_tablebases()
+    while True:
+        job = requests.get()
+        if job is None:
+            break
+
+        job_id, job_generation, kind, board, time_limit = job
+        # Сигнал остановки сбрасывается до проверки поколения: cancel сначала меняет поколение, потом ставит сигнал,
+        # поэтому отмена, пришедшая после проверки, оставит сигнал поднятым и остановит перебор
+        stop_event.clear()
+        if job_generation != generation.value:
+            continue  # Задание отменено, пока ждало в очереди
+
+        if kind == 'search':
+            result = search(board, time_limit, stop_event=stop_event, book=book, tablebases=tablebases)
+        else:
+            # Полный разбор позиции: все допустимые ходы, сгруппированные по клеткам, откуда они делаются
+            result = {}
+            for move in board.legal_moves():
+                result.setdefault(move[0], []).append(move)
+
+        if job_generation == generation.value:
+            results.put((job_id, kind, result))
+
+    if book is not None:
+        book.close()
+    if tablebases is not None:
+        tablebases.close()
+
+
+class EngineWorker:
+    """Фоновый процесс с очередями заданий и результатов"""
+    def __init__(self):
+        self.requests = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        # Номер поколения заданий: при отмене он увеличивается, и старые задания становятся устаревшими
+        self.generation = multiprocessing.Value('i', 0)
+        self.last_job = 0
+        # Результаты заданий с меньшими номерами устарели
+        self.first_actual_job = 1
+        self.process = multiprocessing.Process(target=worker_loop, daemon=True,
+                                               args=(self.requests, self.results, self.stop_event, self.generation))
+        self.process.start()
+
+    def submit(self, kind, board, time_limit=1.0) -> int:
+        """Отправить задание 'search' (поиск хода) или 'moves' (все допустимые ходы), вернуть его номер"""
+        self.last_job += 1
+        self.requests.put((self.last_job, self.generation.value, kind, board, time_limit))
+        return self.last_job
+
+    def cancel(self) -> None:
+        """Отменить все отправленные задания и остановить идущий перебор"""
+        with self.generation.get_lock():
+            self.generation.value += 1
+        self.stop_event.set()
+        self.first_actual_job = self.last_job + 1
+
+    def poll(self) -> list[tuple[int, str, object]]:
+        """Забрать готовые результаты неотмененных заданий (номер задания, вид, результат), не дожидаясь остальных"""
+        ready = []
+        while True:
+            try:
+                job = self.results.get_nowait()
+            except queue.Empty:
+                return ready
+            if job[0] >= self.first_actual_job:
+                ready.append(job)
+
+    def close(self) -> None:
+        """Остановить фоновый процесс"""
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,21 @@
+"""Ключи для хеширования позиции по Зобристу
+Ключи порождаются генератором с фиксированным зерном, поэтому хеш позиции одинаков во всех процессах и запусках
+и его можно сохранять в файлах (кэши, базы позиций)"""
+from random import Random
+
+from colors import WHITE, BLACK
+
+_random = Random(20240601)
+
+# Ключ для каждой фигуры (цвет, символ) на каждой клетке row * 8 + col
+PIECE_KEYS = {(color, char): [_random.getrandbits(64) for _ in range(64)]
+              for color in (WHITE, BLACK) for char in ('P', 'N', 'B', 'R', 'Q', 'K')}
+
+# Ключ права рокировки (цвет, столбец ладьи)
+CASTLING_KEYS = {(color, rook_col): _random.getrandbits(64) for color in (WHITE, BLACK) for rook_col in (0, 7)}
+
+# Ключ вертикали, на которой стоит пешка, которую можно взять на проходе
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+# Ключ хода черных
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)